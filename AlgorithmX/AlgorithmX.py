@@ -1,6 +1,37 @@
+import hashlib
+import heapq
+import json
+import os
 import random
+import time
+from array import array
+from itertools import chain, count, product
 
-class AlgorithmX:
+import numpy as np
+
+
+class SolverBuilder:
+    @classmethod
+    def from_arrays(cls, row_tags, col_index_matrix, cols=None):
+        """
+        Build a solver in one pass from the tag of each row and the column indices in each row, e.g. a 1D and a
+        2D NumPy array (sets x constituencies) built with pd.factorize.
+        cols - number of columns (default: one more than the largest column index)
+        """
+        if hasattr(row_tags, "tolist"):
+            row_tags = row_tags.tolist()
+        if hasattr(col_index_matrix, "tolist"):
+            col_index_matrix = col_index_matrix.tolist()
+        if cols is None:
+            cols = 1 + max([max(row) for row in col_index_matrix if len(row) > 0], default=-1)
+
+        solver = cls(cols)
+        for tag, row in zip(row_tags, col_index_matrix):
+            solver.appendRow(row, tag)
+        return solver
+
+
+class AlgorithmX(SolverBuilder):
     class Node:
         def __init__(self, tag=None):
             self.L = self
@@ -10,12 +41,23 @@ class AlgorithmX:
             self.C = self
             self.S = 0
             self.tag = tag
+            self.row = None
 
     def __init__(self, cols):
         assert cols >= 0, "Number of columns must be non-negative"
         self.cols = []
         self.rows = 0
         self.h = AlgorithmX.Node()
+        # The first node of each (non-empty) row and the order of the column headers, used to relink the matrix.
+        self.row_heads = []
+        self.col_order = []
+        # Set once a search has been started, as it may have been left part way through with columns covered.
+        self.dirty = False
+        # Position of the last non-recursive search (see checkpoint).
+        self.cursor = None
+        self.finished = False
+        self._level = None
+        self._start = ([], False)
 
         last = self.h
         for col in range(cols):
@@ -27,11 +69,13 @@ class AlgorithmX:
 
         last.R = self.h
         self.h.L = last
+        self.col_order = list(self.cols)
 
     def appendRow(self, cols, tag=None):
 
         if tag is None:
             tag = self.rows
+        self._restore()
 
         cols = list(sorted(set(cols)))
         first = None
@@ -42,6 +86,7 @@ class AlgorithmX:
             self.cols[idx].S += 1
 
             cur = AlgorithmX.Node(tag)
+            cur.row = self.rows
             if first is None:
                 first = cur
 
@@ -60,9 +105,63 @@ class AlgorithmX:
         if first is not None:
             last.R = first
             first.L = last
+            self.row_heads.append(first)
 
         self.rows += 1
 
+    def _relink(self):
+        # Rebuild the column header list and every vertical link from the row heads, in the order given by
+        # col_order and row_heads. The horizontal links within a row are never changed by a search so this
+        # restores the full matrix however the last search was left (even part way through a cover).
+        last = self.h
+        for c in self.col_order:
+            last.R = c
+            c.L = last
+            c.U = c
+            c.D = c
+            c.S = 0
+            last = c
+        last.R = self.h
+        self.h.L = last
+
+        for first in self.row_heads:
+            cur = first
+            while True:
+                c = cur.C
+                c.S += 1
+                cur.U = c.U
+                cur.U.D = cur
+                cur.D = c
+                c.U = cur
+                cur = cur.R
+                if cur == first:
+                    break
+        self.dirty = False
+
+    def _restore(self):
+        if self.dirty:
+            self._relink()
+
+    def reset(self):
+        """
+        Restore the full matrix after a search that was stopped part way through (e.g. a break out of the loop
+        over solve, or a timeout). Starting a new search does this automatically.
+        """
+        self._relink()
+
+    def shuffle(self, rng=None):
+        """
+        Randomise, in place, the order in which the rows of each column are tried and the order of the columns
+        (which decides ties in the column choice), so that the same built matrix can be rerun to give the
+        solutions in a different order. Also restores the full matrix.
+        rng - a random.Random instance (default: the random module)
+        """
+        if rng is None:
+            rng = random
+        rng.shuffle(self.row_heads)
+        rng.shuffle(self.col_order)
+        self._relink()
+
     def _cover(self, c):
         c.L.R = c.R
         c.R.L = c.L
@@ -130,6 +229,1742 @@ class AlgorithmX:
 
         self._uncover(col)
 
-    def solve(self, limit=None):
-        self.limit = limit
-        return self._solve()
+    def _choose(self):
+        col = None
+        cur = self.h.R
+        while cur != self.h:
+            if col is None or cur.S < col.S:
+                col = cur
+            cur = cur.R
+        return col
+
+    def _solve_iter(self, out=None, as_tuple=False, limit=None, deadline=None, cursor=None, explored=False,
+                    prefix=None):
+        # Explicit stack version of _solve. The partial solution is kept in one preallocated buffer (or the
+        # caller's buffer, out) so a solution of depth d costs one copy rather than d list concatenations.
+        depth = len(self.cols) + 1
+        nodes = [None] * depth
+        sol = [None] * depth if out is None else out
+        level = 0
+        self.expanded = 0
+        self.cursor = None
+        # Where the search is up to, for checkpoint: the chosen rows and the level of the last solution yielded.
+        self._nodes = nodes
+        self._level = None
+        self._start = (list(cursor or []), explored)
+        self.finished = False
+        # Only search beneath the prefix rows, stopping when the search backtracks past them.
+        floor = 0
+        if prefix is not None:
+            cursor, floor = prefix, len(prefix)
+
+        # Carry on from a previous search: follow the rows in the cursor back down to where it stopped.
+        for row in cursor or ():
+            col = self._choose()
+            r = col.D
+            while r != col and r.row != row:
+                r = r.D
+            if r == col:
+                self._unwind(nodes, level)
+                raise ValueError("The cursor does not match this solver")
+            self._cover(col)
+            nodes[level] = r
+            sol[level] = r.tag
+            level += 1
+            cur = r.R
+            while cur != r:
+                self._cover(cur.C)
+                cur = cur.R
+
+        while True:
+            r = None
+            if explored:
+                # The cursor's node has already been searched, so go straight on to the next row.
+                explored = False
+            elif self.h.R == self.h:
+                self._level = level
+                if out is not None:
+                    yield level
+                elif as_tuple:
+                    yield tuple(sol[:level])
+                else:
+                    yield sol[:level]
+            elif (limit is not None and self.expanded >= limit) or \
+                    (deadline is not None and self.expanded % 256 == 0 and time.time() >= deadline):
+                # Out of budget: remember where to carry on from and put the matrix back.
+                self.cursor = [nodes[i].row for i in range(level)]
+                self._unwind(nodes, level)
+                return
+            else:
+                self.expanded += 1
+                col = self._choose()
+                self._cover(col)
+                r = col.D
+                if r == col:
+                    self._uncover(col)
+                    r = None
+
+            # Move on to the next row, backtracking up the levels when a column has run out of rows.
+            while r is None:
+                if level == floor:
+                    self._unwind(nodes, level)
+                    self.finished = True
+                    return
+                level -= 1
+                r = nodes[level]
+                cur = r.L
+                while cur != r:
+                    self._uncover(cur.C)
+                    cur = cur.L
+                col = r.C
+                r = r.D
+                if r == col:
+                    self._uncover(col)
+                    r = None
+
+            nodes[level] = r
+            sol[level] = r.tag
+            level += 1
+            cur = r.R
+            while cur != r:
+                self._cover(cur.C)
+                cur = cur.R
+
+    def _unwind(self, nodes, level):
+        # Uncover the rows chosen at each level of the search, deepest first.
+        for i in range(level - 1, -1, -1):
+            r = nodes[i]
+            cur = r.L
+            while cur != r:
+                self._uncover(cur.C)
+                cur = cur.L
+            self._uncover(r.C)
+
+    def solve(self, limit=None, recursive=False, as_tuple=False, out=None, deadline=None, cursor=None,
+              explored=False, prefix=None):
+        """
+        Return a generator over the exact covers, each a list of row tags.
+        limit - maximum number of search nodes to expand
+        recursive - use the original recursive search rather than the explicit stack one
+        as_tuple - yield each solution as a tuple rather than a list
+        out - a caller-provided buffer (list or array) of length at least the number of columns. Each solution is
+            written into out[:k] and the generator yields k instead of a new list or tuple.
+        deadline - wall-clock time (as given by time.time()) after which the search stops
+        cursor - carry on from where a previous search of this solver (in the same row order) stopped
+        explored - the sub-problem at the end of cursor has already been searched (see checkpoint)
+        prefix - only search for the solutions which start with these rows (one of the sub-problems from split)
+
+        When the search stops early because of limit or deadline, the generator simply ends (having yielded the
+        solutions found so far) and self.cursor is set to the branch choices (row numbers, in the order the rows
+        were appended) to pass back as cursor to carry on from. After a complete search self.cursor is None.
+        self.expanded is the number of search nodes that were expanded.
+        """
+        self._restore()
+        self.dirty = True
+        if recursive:
+            assert not as_tuple and out is None, "as_tuple and out are only supported by the non-recursive search"
+            assert deadline is None and cursor is None and prefix is None, \
+                "deadline, cursor and prefix are only supported by the non-recursive search"
+            self.limit = limit
+            return self._solve()
+        assert prefix is None or cursor is None, "Only one of cursor and prefix can be given"
+        if out is not None:
+            assert len(out) >= len(self.cols), "out must have at least as many entries as there are columns"
+        return self._solve_iter(out=out, as_tuple=as_tuple, limit=limit, deadline=deadline, cursor=cursor,
+                                explored=explored, prefix=prefix)
+
+    def split(self, depth):
+        """
+        Split the search into independent sub-problems by making the first depth branching choices, so that they
+        can be solved in parallel (e.g. in separate processes, see algox_modules.parallel_solutions).
+        Returns a list of prefixes (row numbers, in the order the rows were appended) to pass to solve as prefix.
+        Searching each prefix in turn gives exactly the same solutions, in the same order, as solve. Branches
+        which run out of rows before depth are left out, and a solution shallower than depth is its own prefix.
+        """
+        self._restore()
+        self.dirty = True
+        prefixes = []
+        path = []
+
+        def branch():
+            if self.h.R == self.h or len(path) == depth:
+                prefixes.append(list(path))
+                return
+            col = self._choose()
+            self._cover(col)
+            r = col.D
+            while r != col:
+                cur = r.R
+                while cur != r:
+                    self._cover(cur.C)
+                    cur = cur.R
+                path.append(r.row)
+                branch()
+                path.pop()
+                cur = r.L
+                while cur != r:
+                    self._uncover(cur.C)
+                    cur = cur.L
+                r = r.D
+            self._uncover(col)
+
+        branch()
+        self.dirty = False
+        return prefixes
+
+    def fingerprint(self):
+        """
+        A hash of the matrix in its current row and column order, used to check that a checkpoint is resumed by a
+        solver built (and shuffled) in exactly the same way as the one that saved it.
+        """
+        index = {c: i for i, c in enumerate(self.cols)}
+        h = hashlib.sha1()
+        h.update(repr([index[c] for c in self.col_order]).encode())
+        for first in self.row_heads:
+            cols = [index[first.C]]
+            cur = first.R
+            while cur != first:
+                cols.append(index[cur.C])
+                cur = cur.R
+            h.update(repr((first.row, cols)).encode())
+        return h.hexdigest()
+
+    def checkpoint(self):
+        """
+        Return the position of the current (or last) non-recursive search, as a dict which can be passed to resume
+        (possibly in another process, see save_checkpoint) to carry on with the solutions that have not yet been
+        yielded. If called between solutions the search carries on after the last solution yielded. The 'path' is
+        None once the search is complete.
+        """
+        if self.finished:
+            path, explored = None, False
+        elif self.cursor is not None:
+            path, explored = self.cursor, False
+        elif self._level is not None:
+            path, explored = [self._nodes[i].row for i in range(self._level)], True
+        else:
+            path, explored = self._start
+        return {'path': path, 'explored': explored, 'fingerprint': self.fingerprint()}
+
+    def save_checkpoint(self, file_name):
+        """
+        Save checkpoint() to a JSON file, replacing it atomically so an interrupted save leaves the old one intact.
+        """
+        tmp_name = file_name + ".tmp"
+        with open(tmp_name, "w") as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(tmp_name, file_name)
+
+    def resume(self, checkpoint, **kwargs):
+        """
+        Carry on a search from a checkpoint (a dict from checkpoint or load_checkpoint). The keyword arguments are
+        passed on to solve. Returns a generator over the remaining solutions (empty if the search was complete).
+        """
+        if checkpoint['fingerprint'] != self.fingerprint():
+            raise ValueError("The checkpoint was saved by a solver with a different matrix or row order")
+        if checkpoint['path'] is None:
+            # Nothing left to search, and checkpoint must go on saying so (not fall back to the start)
+            self.cursor = None
+            self._level = None
+            self.finished = True
+            return iter(())
+        return self.solve(cursor=checkpoint['path'], explored=checkpoint['explored'], **kwargs)
+
+    def count(self, memo=True, deadline=None):
+        """
+        Count the exact covers without building any of the solutions.
+        memo - cache the number of covers of each sub-problem, keyed on the set of columns still to be covered
+            (held as a bitmask), so that sub-problems reached by different partial solutions are only counted once.
+        deadline - wall-clock time (as given by time.time()) after which a TimeoutError is raised
+        """
+        self._restore()
+        self.deadline = deadline
+        self.expanded = 0
+        bit, remaining = self._bitmasks()
+        try:
+            return self._count(remaining, bit, {} if memo else None)
+        except TimeoutError:
+            self._relink()
+            raise
+
+    def _bitmasks(self):
+        # A bit for each column and the bitmask of the columns which are currently uncovered.
+        bit = {c: 1 << i for i, c in enumerate(self.cols)}
+        remaining = 0
+        cur = self.h.R
+        while cur != self.h:
+            remaining |= bit[cur]
+            cur = cur.R
+        return bit, remaining
+
+    def _count(self, remaining, bit, cache):
+        if self.h.R == self.h:
+            return 1
+        if cache is not None and remaining in cache:
+            return cache[remaining]
+
+        self.expanded += 1
+        if self.deadline is not None and self.expanded % 256 == 0 and time.time() >= self.deadline:
+            raise TimeoutError("Deadline reached while counting the exact covers")
+
+        col = self._choose()
+        self._cover(col)
+
+        total = 0
+        r = col.D
+        while r != col:
+            sub = remaining & ~bit[col]
+            cur = r.R
+            while cur != r:
+                self._cover(cur.C)
+                sub &= ~bit[cur.C]
+                cur = cur.R
+
+            total += self._count(sub, bit, cache)
+
+            cur = r.L
+            while cur != r:
+                self._uncover(cur.C)
+                cur = cur.L
+
+            r = r.D
+
+        self._uncover(col)
+        if cache is not None:
+            cache[remaining] = total
+        return total
+
+    def distribution(self, weights, deadline=None):
+        """
+        The exact distribution of the total weight of the rows in a cover, over all of the exact covers, without
+        building any of the solutions. As with count, the result for each sub-problem is cached by the columns
+        still to be covered, so the time depends on the number of distinct sub-problems rather than of covers.
+        weights - dict from row tag to a sequence of non-negative ints (e.g. the seats won by each party in a set)
+        deadline - wall-clock time (as given by time.time()) after which a TimeoutError is raised
+        Returns an (exact, object) int matrix with a row per entry of the weights and a column per total: entry
+        [p, k] is the number of covers whose weights add up to k in entry p. Each row sums to the number of covers.
+        """
+        self._restore()
+        self.deadline = deadline
+        self.expanded = 0
+        bit, remaining = self._bitmasks()
+        weights = {tag: np.asarray(w, dtype=int) for tag, w in weights.items()}
+        size = len(next(iter(weights.values())))
+        try:
+            return self._distribution(remaining, bit, {}, weights, size)
+        except TimeoutError:
+            self._relink()
+            raise
+
+    def _distribution(self, remaining, bit, cache, weights, size):
+        if self.h.R == self.h:
+            return np.ones((size, 1), dtype=object)
+        if remaining in cache:
+            return cache[remaining]
+
+        self.expanded += 1
+        if self.deadline is not None and self.expanded % 256 == 0 and time.time() >= self.deadline:
+            raise TimeoutError("Deadline reached while finding the distribution of the covers")
+
+        col = self._choose()
+        self._cover(col)
+
+        # The distribution beneath each row, shifted by the row's weights
+        parts = []
+        r = col.D
+        while r != col:
+            sub = remaining & ~bit[col]
+            cur = r.R
+            while cur != r:
+                self._cover(cur.C)
+                sub &= ~bit[cur.C]
+                cur = cur.R
+
+            below = self._distribution(sub, bit, cache, weights, size)
+            if below.any():
+                parts.append((weights[r.tag], below))
+
+            cur = r.L
+            while cur != r:
+                self._uncover(cur.C)
+                cur = cur.L
+
+            r = r.D
+
+        self._uncover(col)
+        total = _add_shifted(parts, size)
+        cache[remaining] = total
+        return total
+
+    def optimise(self, costs, k=1, deadline=None):
+        """
+        Search for the k exact covers with the lowest total cost by branch and bound, yielding (cost, solution)
+        each time a cover joins the best k found so far, so a caller can stop at any point with the best covers
+        found up to then (see best). The rows of each column are tried cheapest first, and a branch is cut off
+        when its cost so far plus a lower bound on the cost of covering the remaining columns (each column's
+        cheapest share of a row, a row's cost being shared equally between its columns) can't beat the k-th best.
+        costs - dict from row tag to its cost, e.g. the electorate imbalance of a merged set
+        deadline - wall-clock time (as given by time.time()) after which the search stops
+        self.top is the best covers found so far as a list of (cost, solution), cheapest first, and self.finished is
+        True once the search is complete (so self.top is the best k covers). self.expanded is the number of
+        search nodes that were expanded.
+        """
+        self._restore()
+        self.dirty = True
+        self.expanded = 0
+        self.finished = False
+        self.top = []
+        # The share of each row's cost that falls on each of its columns
+        share = {}
+        for first in self.row_heads:
+            n = 1
+            cur = first.R
+            while cur != first:
+                n += 1
+                cur = cur.R
+            share[first.row] = costs[first.tag] / n
+        return self._optimise(costs, k, deadline, share)
+
+    def _optimise(self, costs, k, deadline, share):
+        # Max heap (on cost) of the best k covers so far, with a counter to break ties
+        heap = []
+        path = []
+        tiebreak = count()
+
+        def bound():
+            total = 0
+            c = self.h.R
+            while c != self.h:
+                r = c.D
+                if r == c:
+                    return float("inf")
+                cheapest = share[r.row]
+                r = r.D
+                while r != c:
+                    cheapest = min(cheapest, share[r.row])
+                    r = r.D
+                total += cheapest
+                c = c.R
+            return total
+
+        def branch(cost):
+            if self.h.R == self.h:
+                if len(heap) == k and cost >= -heap[0][0]:
+                    return
+                if len(heap) == k:
+                    heapq.heapreplace(heap, (-cost, next(tiebreak), list(path)))
+                else:
+                    heapq.heappush(heap, (-cost, next(tiebreak), list(path)))
+                self.top = sorted((-c, s) for c, _, s in heap)
+                yield cost, list(path)
+                return
+            self.expanded += 1
+            if deadline is not None and self.expanded % 256 == 0 and time.time() >= deadline:
+                raise TimeoutError("Deadline reached while searching for the best covers")
+            if len(heap) == k and cost + bound() >= -heap[0][0]:
+                return
+
+            col = self._choose()
+            self._cover(col)
+            rows = []
+            r = col.D
+            while r != col:
+                rows.append(r)
+                r = r.D
+            rows.sort(key=lambda r: costs[r.tag])
+            for r in rows:
+                cur = r.R
+                while cur != r:
+                    self._cover(cur.C)
+                    cur = cur.R
+                path.append(r.tag)
+                yield from branch(cost + costs[r.tag])
+                path.pop()
+                cur = r.L
+                while cur != r:
+                    self._uncover(cur.C)
+                    cur = cur.L
+            self._uncover(col)
+
+        try:
+            yield from branch(0)
+            self.finished = True
+            self.dirty = False
+        except TimeoutError:
+            self._relink()
+
+    def best(self, costs, k=1, deadline=None):
+        """
+        The k exact covers with the lowest total cost (or the best found before the deadline, see optimise), as a
+        list of (cost, solution), cheapest first. self.finished is False if the deadline was reached.
+        """
+        for _ in self.optimise(costs, k, deadline):
+            pass
+        return self.top
+
+    def sample(self, n, rng=None, deadline=None):
+        """
+        Draw n exact covers independently and uniformly at random (with replacement) from all of the covers.
+        Each branch of the search is taken with probability proportional to the number of covers beneath it,
+        using the memoised sub-problem counts from count, so no solutions are enumerated.
+        Returns a list of n solutions (lists of row tags), or an empty list if there are no covers.
+        rng - a random.Random instance to draw from (default: the random module)
+        deadline - wall-clock time (as given by time.time()) after which a TimeoutError is raised
+        """
+        if rng is None:
+            rng = random
+        self._restore()
+        self.deadline = deadline
+        self.expanded = 0
+        bit, remaining = self._bitmasks()
+        cache = {}
+        try:
+            if self._count(remaining, bit, cache) == 0:
+                return []
+            return [self._sample(remaining, bit, cache, rng) for _ in range(n)]
+        except TimeoutError:
+            self._relink()
+            raise
+
+    def _sample(self, remaining, bit, cache, rng):
+        path = []
+        while self.h.R != self.h:
+            col = self._choose()
+            self._cover(col)
+
+            # Number of covers beneath each of the rows in the column
+            rows = []
+            weights = []
+            r = col.D
+            while r != col:
+                sub = remaining & ~bit[col]
+                cur = r.R
+                while cur != r:
+                    self._cover(cur.C)
+                    sub &= ~bit[cur.C]
+                    cur = cur.R
+
+                rows.append((r, sub))
+                weights.append(self._count(sub, bit, cache))
+
+                cur = r.L
+                while cur != r:
+                    self._uncover(cur.C)
+                    cur = cur.L
+
+                r = r.D
+
+            k = rng.randrange(sum(weights))
+            i = 0
+            while k >= weights[i]:
+                k -= weights[i]
+                i += 1
+            r, remaining = rows[i]
+
+            cur = r.R
+            while cur != r:
+                self._cover(cur.C)
+                cur = cur.R
+            path.append(r)
+
+        # Put the matrix back the way we found it
+        for r in reversed(path):
+            cur = r.L
+            while cur != r:
+                self._uncover(cur.C)
+                cur = cur.L
+            self._uncover(r.C)
+
+        return [r.tag for r in path]
+
+
+def _add_shifted(parts, size):
+    # The sum of the distributions (see AlgorithmX.distribution) below each row, each shifted by the row's weights
+    width = max([w.max() + below.shape[1] for w, below in parts], default=1)
+    total = np.zeros((size, width), dtype=object)
+    for w, below in parts:
+        total[np.arange(size)[:, None], w[:, None] + np.arange(below.shape[1])] += below
+    return total
+
+
+def load_checkpoint(file_name):
+    """
+    Load a checkpoint saved with AlgorithmX.save_checkpoint, to pass to AlgorithmX.resume.
+    """
+    with open(file_name) as f:
+        return json.load(f)
+
+
+class AlgorithmXArray(SolverBuilder):
+    """
+    Dancing links solver with the same appendRow / solve interface as AlgorithmX, but with the links held in
+    flat integer arrays indexed by node id rather than one Python object per node.
+    Node 0 is the root, nodes 1..cols are the column headers and every nonzero appended after that is a node.
+    The memory saving only holds at rest: each search works on list copies of the arrays (see _links), so while
+    solving under CPython it uses more memory than AlgorithmX. For the South East quads (tracemalloc, CPython
+    3.11) the built solver takes 344 KB against 1511 KB for AlgorithmX, but 1875 KB once the search has copied
+    the links. Searching the arrays directly keeps that to 531 KB, but is 2-3 times slower, as each lookup boxes a
+    new int.
+    """
+    def __init__(self, cols):
+        assert cols >= 0, "Number of columns must be non-negative"
+        self.ncols = cols
+        self.rows = 0
+        self.tags = []
+
+        nodes = range(cols + 1)
+        self.L = array('i', [(i - 1) % (cols + 1) for i in nodes])
+        self.R = array('i', [(i + 1) % (cols + 1) for i in nodes])
+        self.U = array('i', nodes)
+        self.D = array('i', nodes)
+        self.C = array('i', nodes)
+        self.S = array('i', [0] * (cols + 1))
+        # The row (index into self.tags) that each node belongs to, -1 for the root and column headers.
+        self.row = array('i', [-1] * (cols + 1))
+        # The first node of each (non-empty) row and the order of the column headers, used by shuffle.
+        self.row_heads = array('i')
+        self.col_order = array('i', range(1, cols + 1))
+
+    def appendRow(self, cols, tag=None):
+
+        if tag is None:
+            tag = self.rows
+
+        cols = list(sorted(set(cols)))
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        first = len(U)
+        for k, idx in enumerate(cols):
+            assert 0 <= idx < self.ncols, "Column index must be between 0 and number of columns - 1"
+
+            c = idx + 1
+            cur = first + k
+            S[c] += 1
+            U.append(U[c])
+            D.append(c)
+            D[U[c]] = cur
+            U[c] = cur
+            C.append(c)
+            L.append(cur - 1 if k > 0 else first + len(cols) - 1)
+            R.append(cur + 1 if k < len(cols) - 1 else first)
+            self.row.append(self.rows)
+
+        if len(cols) > 0:
+            self.row_heads.append(first)
+        self.tags.append(tag)
+        self.rows += 1
+
+    def reset(self):
+        """
+        Nothing to do: each search works on copies of the arrays, so the matrix is always left complete.
+        Provided so that all of the solvers can be used in the same way.
+        """
+
+    def shuffle(self, rng=None):
+        """
+        Randomise, in place, the order in which the rows of each column are tried and the order of the columns,
+        in the same way as AlgorithmX.shuffle.
+        """
+        if rng is None:
+            rng = random
+        row_heads = list(self.row_heads)
+        col_order = list(self.col_order)
+        rng.shuffle(row_heads)
+        rng.shuffle(col_order)
+        self.row_heads = array('i', row_heads)
+        self.col_order = array('i', col_order)
+
+        L, R, U, D, C = self.L, self.R, self.U, self.D, self.C
+        last = 0
+        for c in col_order:
+            R[last] = c
+            L[c] = last
+            U[c] = c
+            D[c] = c
+            last = c
+        R[last] = 0
+        L[0] = last
+
+        for first in row_heads:
+            cur = first
+            while True:
+                c = C[cur]
+                U[cur] = U[c]
+                D[U[c]] = cur
+                D[cur] = c
+                U[c] = cur
+                cur = R[cur]
+                if cur == first:
+                    break
+
+    def _links(self):
+        # Work on list copies of the arrays: list indexing is several times faster than array indexing under
+        # CPython, and the arrays are left untouched so every call to solve starts from the full matrix.
+        return [list(a) for a in (self.L, self.R, self.U, self.D, self.C, self.S)]
+
+    def _solve(self, out=None, as_tuple=False, limit=None, deadline=None, cursor=None):
+        L, R, U, D, C, S = self._links()
+        row, tags = self.row, self.tags
+
+        # The links are bound as default arguments, so they are fast locals in these inner loops rather than
+        # closure cells.
+        def cover(c, L=L, R=R, U=U, D=D, C=C, S=S):
+            L[R[c]] = L[c]
+            R[L[c]] = R[c]
+
+            i = D[c]
+            while i != c:
+                j = R[i]
+                while j != i:
+                    D[U[j]] = D[j]
+                    U[D[j]] = U[j]
+                    S[C[j]] -= 1
+                    j = R[j]
+                i = D[i]
+
+        def uncover(c, L=L, R=R, U=U, D=D, C=C, S=S):
+            i = U[c]
+            while i != c:
+                j = L[i]
+                while j != i:
+                    S[C[j]] += 1
+                    D[U[j]] = j
+                    U[D[j]] = j
+                    j = L[j]
+                i = U[i]
+
+            L[R[c]] = c
+            R[L[c]] = c
+
+        # The row node chosen at each level of the search (the column covered at a level is C of that node)
+        # and the matching row tags.
+        def choose(R=R, S=S):
+            # The first column with the fewest rows, stopping early at an empty column (which is always chosen).
+            col = R[0]
+            least = S[col]
+            cur = R[col]
+            while cur != 0 and least > 0:
+                if S[cur] < least:
+                    col = cur
+                    least = S[cur]
+                cur = R[cur]
+            return col
+
+        depth = self.ncols + 1
+        chosen = [0] * depth
+        sol = [None] * depth if out is None else out
+        level = 0
+        self.expanded = 0
+        self.cursor = None
+
+        # Carry on from a previous search: follow the rows in the cursor back down to where it stopped.
+        for target in cursor or ():
+            col = choose()
+            x = D[col]
+            while x != col and row[x] != target:
+                x = D[x]
+            if x == col:
+                raise ValueError("The cursor does not match this solver")
+            cover(col)
+            chosen[level] = x
+            sol[level] = tags[row[x]]
+            level += 1
+            j = R[x]
+            while j != x:
+                cover(C[j])
+                j = R[j]
+
+        while True:
+            x = None
+            if R[0] == 0:
+                if out is not None:
+                    yield level
+                elif as_tuple:
+                    yield tuple(sol[:level])
+                else:
+                    yield sol[:level]
+            elif (limit is not None and self.expanded >= limit) or \
+                    (deadline is not None and self.expanded % 256 == 0 and time.time() >= deadline):
+                # Out of budget: remember where to carry on from (the working copies are just dropped).
+                self.cursor = [row[chosen[i]] for i in range(level)]
+                return
+            else:
+                self.expanded += 1
+                col = choose()
+                # An empty column is a dead end, so there is no need to cover it
+                if S[col] > 0:
+                    cover(col)
+                    x = D[col]
+
+            # Find the next row to try, backtracking up the levels when a column runs out of rows.
+            while x is None:
+                if level == 0:
+                    return
+                level -= 1
+                x = chosen[level]
+                j = L[x]
+                while j != x:
+                    uncover(C[j])
+                    j = L[j]
+                col = C[x]
+                x = D[x]
+                if x == col:
+                    uncover(col)
+                    x = None
+
+            chosen[level] = x
+            sol[level] = tags[row[x]]
+            level += 1
+            j = R[x]
+            while j != x:
+                cover(C[j])
+                j = R[j]
+
+    def solve(self, limit=None, as_tuple=False, out=None, deadline=None, cursor=None):
+        """
+        Return a generator over the exact covers, with the same limit, as_tuple, out, deadline and cursor options
+        as AlgorithmX.solve (self.cursor and self.expanded are set in the same way).
+        """
+        if out is not None:
+            assert len(out) >= self.ncols, "out must have at least as many entries as there are columns"
+        return self._solve(out=out, as_tuple=as_tuple, limit=limit, deadline=deadline, cursor=cursor)
+
+
+def _popcount(x):
+    return bin(x).count("1")
+
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+
+
+class AlgorithmXBits(SolverBuilder):
+    """
+    Exact cover solver with the same appendRow / solve interface as AlgorithmX for problems with a small number of
+    columns (e.g. the constituencies of a region). Each row is held as an integer bitmask over the columns, each
+    column as a bitmask over the rows, and the search moves between sub-problems with bitwise AND / OR rather than
+    covering and uncovering linked lists. Solutions are returned in the same order as AlgorithmX.
+    """
+    def __init__(self, cols):
+        assert cols >= 0, "Number of columns must be non-negative"
+        self.ncols = cols
+        self.rows = 0
+        self.tags = []
+        # Bitmask of the columns in each row and of the rows in each column.
+        self.masks = []
+        self.col_rows = [0] * cols
+        # Bitmask of the rows in each limit_rows constraint, with the fewest and most of them allowed in a cover.
+        self.quotas = []
+        # Position of the last search (see checkpoint).
+        self.cursor = None
+        self.finished = False
+        self._level = None
+        self._start = ([], False)
+
+    def appendRow(self, cols, tag=None):
+
+        if tag is None:
+            tag = self.rows
+
+        mask = 0
+        for idx in set(cols):
+            assert 0 <= idx < self.ncols, "Column index must be between 0 and number of columns - 1"
+            mask |= 1 << idx
+            self.col_rows[idx] |= 1 << self.rows
+
+        self.masks.append(mask)
+        self.tags.append(tag)
+        self.rows += 1
+
+    def limit_rows(self, rows, most, least=0):
+        """
+        Only give the covers which use between least and most of the given rows (row numbers, in the order they
+        were appended), e.g. covers made of quads with no more than two triplets. Once a cover has used most of the
+        rows the rest of them are dropped from the search, so they are never tried.
+        """
+        mask = 0
+        for r in rows:
+            assert 0 <= r < self.rows, "Row number must be between 0 and number of rows - 1"
+            mask |= 1 << int(r)
+        self.quotas.append((mask, least, most))
+
+    def reset(self):
+        """
+        Nothing to do: the search state is held in the generator, so the matrix is always left complete.
+        Provided so that all of the solvers can be used in the same way.
+        """
+
+    def shuffle(self, rng=None):
+        """
+        Randomise, in place, the order in which the rows of each column are tried and the order of the columns,
+        in the same way as AlgorithmX.shuffle. The rows and columns are renumbered in the new order.
+        """
+        if rng is None:
+            rng = random
+        row_order = list(range(self.rows))
+        col_order = list(range(self.ncols))
+        rng.shuffle(row_order)
+        rng.shuffle(col_order)
+        # Bit new_col[c] of a row mask is set for column c.
+        new_col = [0] * self.ncols
+        for i, c in enumerate(col_order):
+            new_col[c] = i
+
+        quotas = []
+        for quota, least, most in self.quotas:
+            mask = 0
+            for r, old in enumerate(row_order):
+                if (quota >> old) & 1:
+                    mask |= 1 << r
+            quotas.append((mask, least, most))
+        self.quotas = quotas
+
+        masks = []
+        col_rows = [0] * self.ncols
+        for r, old in enumerate(row_order):
+            mask = 0
+            old_mask = self.masks[old]
+            while old_mask:
+                low = old_mask & -old_mask
+                c = new_col[low.bit_length() - 1]
+                mask |= 1 << c
+                col_rows[c] |= 1 << r
+                old_mask ^= low
+            masks.append(mask)
+        self.masks = masks
+        self.col_rows = col_rows
+        self.tags = [self.tags[old] for old in row_order]
+
+    def _conflicts(self):
+        # For each row, the bitmask of rows sharing a column with it (including the row itself).
+        conflicts = []
+        for mask in self.masks:
+            conflict = 0
+            while mask:
+                low = mask & -mask
+                conflict |= self.col_rows[low.bit_length() - 1]
+                mask ^= low
+            conflicts.append(conflict)
+        return conflicts
+
+    def _choose(self, remaining, live):
+        # The uncovered column with the fewest live rows, taking the first on ties (Knuth's "S heuristic").
+        col_rows = self.col_rows
+        best = -1
+        best_n = 0
+        while remaining:
+            low = remaining & -remaining
+            c = low.bit_length() - 1
+            n = _popcount(col_rows[c] & live)
+            if best < 0 or n < best_n:
+                best, best_n = c, n
+                if n <= 1:
+                    # A column with no rows is a dead end wherever it is found.
+                    break
+            remaining ^= low
+        return best
+
+    def _live(self):
+        # Every row, apart from those of a limit_rows constraint which allows none of them.
+        live = (1 << self.rows) - 1
+        for mask, _, most in self.quotas:
+            if most <= 0:
+                live &= ~mask
+        return live
+
+    def _take(self, r, live, taken):
+        # The rows still live once row r is added to the rows taken, dropping the rest of the rows of any
+        # limit_rows constraint which r fills up.
+        for mask, _, most in self.quotas:
+            if (mask >> r) & 1 and _popcount(taken & mask) >= most:
+                live &= ~mask
+        return live
+
+    def _solve(self, out=None, as_tuple=False, limit=None, deadline=None, cursor=None, explored=False, prefix=None):
+        masks, tags, col_rows, quotas = self.masks, self.tags, self.col_rows, self.quotas
+        conflicts = self._conflicts()
+
+        # The uncovered columns, rows that can still be used, rows left to try and rows taken so far at each level
+        # of the search, along with the row chosen at each level.
+        depth = self.ncols + 1
+        stack = [None] * depth
+        chosen = [0] * depth
+        sol = [None] * depth if out is None else out
+        level = 0
+        remaining = (1 << self.ncols) - 1
+        live = self._live()
+        taken = 0
+        self.expanded = 0
+        self.cursor = None
+        # Where the search is up to, for checkpoint: the chosen rows and the level of the last solution yielded.
+        self._chosen = chosen
+        self._level = None
+        self._start = (list(cursor or []), explored)
+        self.finished = False
+        # Only search beneath the prefix rows, stopping when the search backtracks past them.
+        floor = 0
+        if prefix is not None:
+            cursor, floor = prefix, len(prefix)
+
+        # Carry on from a previous search: follow the rows in the cursor back down to where it stopped.
+        for r in cursor or ():
+            cand = col_rows[self._choose(remaining, live)] & live
+            if not (cand >> r) & 1:
+                raise ValueError("The cursor does not match this solver")
+            stack[level] = (remaining, live, cand & ~((2 << r) - 1), taken)
+            chosen[level] = r
+            sol[level] = tags[r]
+            level += 1
+            remaining &= ~masks[r]
+            live &= ~conflicts[r]
+            if quotas:
+                taken |= 1 << r
+                live = self._take(r, live, taken)
+
+        while True:
+            cand = 0
+            if explored:
+                # The cursor's node has already been searched, so go straight on to the next row.
+                explored = False
+            elif remaining == 0:
+                if quotas and any(_popcount(taken & mask) < least for mask, least, _ in quotas):
+                    pass
+                else:
+                    self._level = level
+                    if out is not None:
+                        yield level
+                    elif as_tuple:
+                        yield tuple(sol[:level])
+                    else:
+                        yield sol[:level]
+            elif (limit is not None and self.expanded >= limit) or \
+                    (deadline is not None and self.expanded % 256 == 0 and time.time() >= deadline):
+                # Out of budget: remember where to carry on from.
+                self.cursor = chosen[:level]
+                return
+            else:
+                self.expanded += 1
+                cand = col_rows[self._choose(remaining, live)] & live
+
+            while cand == 0:
+                if level == floor:
+                    self.finished = True
+                    return
+                level -= 1
+                remaining, live, cand, taken = stack[level]
+
+            low = cand & -cand
+            r = low.bit_length() - 1
+            stack[level] = (remaining, live, cand ^ low, taken)
+            chosen[level] = r
+            sol[level] = tags[r]
+            level += 1
+            remaining &= ~masks[r]
+            live &= ~conflicts[r]
+            if quotas:
+                taken |= 1 << r
+                live = self._take(r, live, taken)
+
+    def solve(self, limit=None, as_tuple=False, out=None, deadline=None, cursor=None, explored=False, prefix=None):
+        """
+        Return a generator over the exact covers, with the same limit, as_tuple, out, deadline, cursor, explored and
+        prefix options as AlgorithmX.solve (self.cursor and self.expanded are set in the same way).
+        """
+        if out is not None:
+            assert len(out) >= self.ncols, "out must have at least as many entries as there are columns"
+        return self._solve(out=out, as_tuple=as_tuple, limit=limit, deadline=deadline, cursor=cursor,
+                           explored=explored, prefix=prefix)
+
+    def split(self, depth):
+        """
+        Split the search into independent sub-problems by making the first depth branching choices, as
+        AlgorithmX.split. Returns a list of prefixes (row numbers, in the current row order) to pass to solve as
+        prefix, which between them give exactly the same solutions, in the same order, as solve.
+        """
+        masks, col_rows, quotas = self.masks, self.col_rows, self.quotas
+        conflicts = self._conflicts()
+        prefixes = []
+        path = []
+
+        def branch(remaining, live, taken):
+            if remaining == 0 or len(path) == depth:
+                prefixes.append(list(path))
+                return
+            cand = col_rows[self._choose(remaining, live)] & live
+            while cand:
+                low = cand & -cand
+                r = low.bit_length() - 1
+                cand ^= low
+                sub_live, sub_taken = live & ~conflicts[r], taken
+                if quotas:
+                    sub_taken |= low
+                    sub_live = self._take(r, sub_live, sub_taken)
+                path.append(r)
+                branch(remaining & ~masks[r], sub_live, sub_taken)
+                path.pop()
+
+        branch((1 << self.ncols) - 1, self._live(), 0)
+        return prefixes
+
+    def fingerprint(self):
+        """
+        A hash of the matrix (and limit_rows constraints) in its current row and column order, as
+        AlgorithmX.fingerprint.
+        """
+        h = hashlib.sha1()
+        h.update(repr((self.ncols, self.masks, self.quotas)).encode())
+        return h.hexdigest()
+
+    def checkpoint(self):
+        """
+        Return the position of the current (or last) search, as a dict which can be passed to resume, as
+        AlgorithmX.checkpoint. The 'path' is None once the search is complete.
+        """
+        if self.finished:
+            path, explored = None, False
+        elif self.cursor is not None:
+            path, explored = self.cursor, False
+        elif self._level is not None:
+            path, explored = self._chosen[:self._level], True
+        else:
+            path, explored = self._start
+        return {'path': path, 'explored': explored, 'fingerprint': self.fingerprint()}
+
+    def save_checkpoint(self, file_name):
+        """
+        Save checkpoint() to a JSON file, replacing it atomically so an interrupted save leaves the old one intact.
+        """
+        tmp_name = file_name + ".tmp"
+        with open(tmp_name, "w") as f:
+            json.dump(self.checkpoint(), f)
+        os.replace(tmp_name, file_name)
+
+    def resume(self, checkpoint, **kwargs):
+        """
+        Carry on a search from a checkpoint (see AlgorithmX.resume), returning a generator over the remaining
+        solutions (empty if the search was complete).
+        """
+        if checkpoint['fingerprint'] != self.fingerprint():
+            raise ValueError("The checkpoint was saved by a solver with a different matrix or row order")
+        if checkpoint['path'] is None:
+            self.cursor = None
+            self._level = None
+            self.finished = True
+            return iter(())
+        return self.solve(cursor=checkpoint['path'], explored=checkpoint['explored'], **kwargs)
+
+    def _frontier(self):
+        # The row and column bitmasks with the columns renumbered in Cuthill-McKee order (breadth first through the
+        # columns which share a row, fewest neighbours first). Branching on the lowest numbered uncovered column
+        # then keeps the covered columns ahead of it close by, so far fewer distinct sub-problems are met when
+        # counting than with the column with the fewest rows (e.g. 144k rather than millions for South East quads).
+        neighbours = []
+        for c in range(self.ncols):
+            rows, mask = self.col_rows[c], 0
+            while rows:
+                low = rows & -rows
+                mask |= self.masks[low.bit_length() - 1]
+                rows ^= low
+            neighbours.append(mask & ~(1 << c))
+        degree = [_popcount(m) for m in neighbours]
+        order = []
+        visited = 0
+        for start in sorted(range(self.ncols), key=lambda c: degree[c]):
+            if (visited >> start) & 1:
+                continue
+            visited |= 1 << start
+            queue = [start]
+            for c in queue:
+                new, mask = [], neighbours[c] & ~visited
+                while mask:
+                    low = mask & -mask
+                    new.append(low.bit_length() - 1)
+                    mask ^= low
+                new.sort(key=lambda c: degree[c])
+                for n in new:
+                    visited |= 1 << n
+                queue += new
+            order += queue
+        position = [0] * self.ncols
+        for i, c in enumerate(order):
+            position[c] = i
+        masks = []
+        for mask in self.masks:
+            new_mask = 0
+            while mask:
+                low = mask & -mask
+                new_mask |= 1 << position[low.bit_length() - 1]
+                mask ^= low
+            masks.append(new_mask)
+        return masks, [self.col_rows[c] for c in order], self._conflicts()
+
+    def _branches(self, frontier, remaining, live, used):
+        # The sub-problem (remaining columns, live rows, rows used from each limit_rows constraint) beneath each row
+        # of the lowest numbered uncovered column, in the column order of _frontier. The live rows are those left
+        # within the remaining columns and not dropped by a full constraint, so (remaining, used) is enough to
+        # identify a sub-problem.
+        masks, col_rows, conflicts = frontier
+        cand = col_rows[(remaining & -remaining).bit_length() - 1] & live
+        while cand:
+            low = cand & -cand
+            r = low.bit_length() - 1
+            cand ^= low
+            sub_live, sub_used = live & ~conflicts[r], used
+            if self.quotas:
+                sub_live, sub_used = self._use(r, sub_live, used)
+            yield r, remaining & ~masks[r], sub_live, sub_used
+
+    def _use(self, r, live, used):
+        # The live rows and the number of rows used from each limit_rows constraint once row r is added to a cover.
+        # The rows of a constraint are already dropped from live once it is full, so only the constraints which r is
+        # in can fill up.
+        used = list(used)
+        for i, (mask, _, most) in enumerate(self.quotas):
+            if (mask >> r) & 1:
+                used[i] += 1
+                if used[i] >= most:
+                    live &= ~mask
+        return live, tuple(used)
+
+    def _complete(self, used):
+        # Whether a cover using these numbers of rows from each limit_rows constraint is allowed.
+        return all(u >= least for u, (_, least, _) in zip(used, self.quotas))
+
+    def _top(self):
+        # The whole problem, as (remaining, live, used).
+        return (1 << self.ncols) - 1, self._live(), (0,) * len(self.quotas)
+
+    def count(self, memo=True, deadline=None):
+        """
+        Count the exact covers (within the limit_rows constraints) without building any of the solutions, as
+        AlgorithmX.count. The count of each sub-problem is cached by the columns still to be covered and the number
+        of rows used from each limit_rows constraint.
+        """
+        self.deadline = deadline
+        self.expanded = 0
+        return self._count(self._frontier(), *self._top(), {} if memo else None)
+
+    def _count(self, frontier, remaining, live, used, cache):
+        if remaining == 0:
+            return int(self._complete(used))
+        key = (remaining, used)
+        if cache is not None and key in cache:
+            return cache[key]
+
+        self.expanded += 1
+        if self.deadline is not None and self.expanded % 256 == 0 and time.time() >= self.deadline:
+            raise TimeoutError("Deadline reached while counting the exact covers")
+
+        total = 0
+        for _, sub, sub_live, sub_used in self._branches(frontier, remaining, live, used):
+            total += self._count(frontier, sub, sub_live, sub_used, cache)
+        if cache is not None:
+            cache[key] = total
+        return total
+
+    def distribution(self, weights, deadline=None):
+        """
+        The exact distribution of the total weight of the rows in a cover (within the limit_rows constraints), as
+        AlgorithmX.distribution, with the result for each sub-problem cached as in count.
+        """
+        self.deadline = deadline
+        self.expanded = 0
+        weights = {tag: np.asarray(w, dtype=int) for tag, w in weights.items()}
+        size = len(next(iter(weights.values())))
+        total = self._distribution(self._frontier(), *self._top(), {}, weights, size)
+        return np.zeros((size, 1), dtype=object) if total is None else total
+
+    def _distribution(self, frontier, remaining, live, used, cache, weights, size):
+        # None for a sub-problem with no covers, which saves checking for (and storing) all zero arrays
+        if remaining == 0:
+            return np.ones((size, 1), dtype=object) if self._complete(used) else None
+        key = (remaining, used)
+        if key in cache:
+            return cache[key]
+
+        self.expanded += 1
+        if self.deadline is not None and self.expanded % 256 == 0 and time.time() >= self.deadline:
+            raise TimeoutError("Deadline reached while finding the distribution of the covers")
+
+        parts = []
+        for r, sub, sub_live, sub_used in self._branches(frontier, remaining, live, used):
+            below = self._distribution(frontier, sub, sub_live, sub_used, cache, weights, size)
+            if below is not None:
+                parts.append((weights[self.tags[r]], below))
+        total = _add_shifted(parts, size) if parts else None
+        cache[key] = total
+        return total
+
+    def sample(self, n, rng=None, deadline=None):
+        """
+        Draw n exact covers (within the limit_rows constraints) independently and uniformly at random, with
+        replacement, as AlgorithmX.sample. Returns a list of n solutions, or an empty list if there are no covers.
+        """
+        if rng is None:
+            rng = random
+        self.deadline = deadline
+        self.expanded = 0
+        frontier = self._frontier()
+        cache = {}
+        if self._count(frontier, *self._top(), cache) == 0:
+            return []
+        solns = []
+        for _ in range(n):
+            remaining, live, used = self._top()
+            soln = []
+            while remaining:
+                branches = list(self._branches(frontier, remaining, live, used))
+                weights = [self._count(frontier, *branch[1:], cache) for branch in branches]
+                k = rng.randrange(sum(weights))
+                i = 0
+                while k >= weights[i]:
+                    k -= weights[i]
+                    i += 1
+                r, remaining, live, used = branches[i]
+                soln.append(self.tags[r])
+            solns.append(soln)
+        return solns
+
+    def optimise(self, costs, k=1, deadline=None):
+        """
+        Search for the k exact covers (within the limit_rows constraints) with the lowest total cost by branch and
+        bound, yielding (cost, solution) each time a cover joins the best k found so far, as AlgorithmX.optimise
+        (self.top, self.finished and self.expanded are set in the same way).
+        """
+        self.expanded = 0
+        self.finished = False
+        self.top = []
+        # The rows of each column with the share of their cost that falls on each of their columns, cheapest first,
+        # so the bound only has to find the first of them that is still live
+        shares = []
+        for c in range(self.ncols):
+            rows, col = self.col_rows[c], []
+            while rows:
+                low = rows & -rows
+                r = low.bit_length() - 1
+                col.append((costs[self.tags[r]] / _popcount(self.masks[r]), low))
+                rows ^= low
+            col.sort(key=lambda x: x[0])
+            shares.append(col)
+        return self._optimise(costs, k, deadline, shares)
+
+    def _optimise(self, costs, k, deadline, shares):
+        masks, tags, col_rows, quotas = self.masks, self.tags, self.col_rows, self.quotas
+        conflicts = self._conflicts()
+        # Max heap (on cost) of the best k covers so far, with a counter to break ties
+        heap = []
+        path = []
+        tiebreak = count()
+
+        def bound(remaining, live):
+            total = 0
+            while remaining:
+                low = remaining & -remaining
+                for share, bit in shares[low.bit_length() - 1]:
+                    if live & bit:
+                        total += share
+                        break
+                else:
+                    return float("inf")
+                remaining ^= low
+            return total
+
+        def branch(remaining, live, used, cost):
+            if remaining == 0:
+                if not self._complete(used) or (len(heap) == k and cost >= -heap[0][0]):
+                    return
+                if len(heap) == k:
+                    heapq.heapreplace(heap, (-cost, next(tiebreak), list(path)))
+                else:
+                    heapq.heappush(heap, (-cost, next(tiebreak), list(path)))
+                self.top = sorted((-c, s) for c, _, s in heap)
+                yield cost, list(path)
+                return
+            self.expanded += 1
+            if deadline is not None and self.expanded % 256 == 0 and time.time() >= deadline:
+                raise TimeoutError("Deadline reached while searching for the best covers")
+            if len(heap) == k and cost + bound(remaining, live) >= -heap[0][0]:
+                return
+
+            cand = col_rows[self._choose(remaining, live)] & live
+            rows = []
+            while cand:
+                low = cand & -cand
+                rows.append(low.bit_length() - 1)
+                cand ^= low
+            rows.sort(key=lambda r: costs[tags[r]])
+            for r in rows:
+                sub_live, sub_used = live & ~conflicts[r], used
+                if quotas:
+                    sub_live, sub_used = self._use(r, sub_live, used)
+                path.append(tags[r])
+                yield from branch(remaining & ~masks[r], sub_live, sub_used, cost + costs[tags[r]])
+                path.pop()
+
+        try:
+            yield from branch(*self._top(), 0)
+            self.finished = True
+        except TimeoutError:
+            pass
+
+    def best(self, costs, k=1, deadline=None):
+        """
+        The k exact covers with the lowest total cost (or the best found before the deadline, see optimise), as a
+        list of (cost, solution), cheapest first. self.finished is False if the deadline was reached.
+        """
+        for _ in self.optimise(costs, k, deadline):
+            pass
+        return self.top
+
+
+def reduce_matrix(rows, cols):
+    """
+    Simplify an exact cover problem before searching it, repeating until nothing changes:
+    - a column with only one row left forces that row into every cover, so the row is chosen and its columns and
+      every row clashing with it are removed
+    - if every row left in column c also covers column d, a row covering d but not c can't be in a cover (taking
+      it would leave no row for c), so it is removed
+    - a column with no rows left means there are no covers
+    rows - the column indices of each row
+    cols - number of columns
+    Returns the row numbers which are in every cover, the row numbers and the columns that are left to search
+    (both sorted), or None if there are no covers.
+    """
+    live = {r for r, row in enumerate(rows) if len(row) > 0}
+    col_rows = [set() for _ in range(cols)]
+    for r in live:
+        for c in rows[r]:
+            col_rows[c].add(r)
+    uncovered = set(range(cols))
+    forced = []
+
+    def remove(r):
+        live.discard(r)
+        for c in rows[r]:
+            col_rows[c].discard(r)
+
+    changed = True
+    while changed:
+        changed = False
+        for c in sorted(uncovered):
+            if c not in uncovered:
+                continue
+            if len(col_rows[c]) == 0:
+                return None
+            if len(col_rows[c]) == 1:
+                r = next(iter(col_rows[c]))
+                forced.append(r)
+                for c2 in rows[r]:
+                    uncovered.discard(c2)
+                    for r2 in list(col_rows[c2]):
+                        remove(r2)
+                changed = True
+        for c in sorted(uncovered):
+            # The columns covered by every row left in c
+            common = set.intersection(*[set(rows[r]) for r in col_rows[c]]) if col_rows[c] else set()
+            for d in common - {c}:
+                for r in [r for r in col_rows[d] if r not in col_rows[c]]:
+                    remove(r)
+                    changed = True
+    return sorted(forced), sorted(live), sorted(uncovered)
+
+
+# The minority sets, and how many of them, used to cover a region when its number of constituencies isn't
+# divisible by the number of seats, keyed by (seats, number of constituencies % seats)
+MIXED_COVERS = {
+    (2, 1): ('triplet', 1),
+    (3, 1): ('quad', 1),
+    (3, 2): ('pair', 1),
+    (4, 1): ('triplet', 3),
+    (4, 2): ('triplet', 2),
+    (4, 3): ('triplet', 1),
+}
+
+
+def mixed_cover_solver(tags, names, minority_tags, minority_names, most):
+    """
+    Build an AlgorithmXBits solver for the covers made of a set of rows along with up to `most` of a set of minority
+    rows, e.g. the pairs of a region with an odd number of constituencies along with one triplet (see MIXED_COVERS).
+    As the number of columns left has to be divisible by the size of the other rows, every cover then uses exactly
+    the number of minority rows needed, so one search covers every choice of them.
+    tags, names - the tag of each row and the names (e.g. of the constituencies) it covers, the columns being all of
+        the names in sorted order
+    minority_tags, minority_names - likewise for the minority rows, which are tagged with their negative tag
+    The matrix is reduced first (see reduce_matrix), dropping the rows which can't be in any cover, and None is
+    returned if the reduction shows there are no covers at all. The forced rows are kept, as the only row left in
+    their columns they are chosen straight away.
+    """
+    rows = [list(row) for row in names] + [list(row) for row in minority_names]
+    row_tags = [int(t) for t in tags] + [-int(t) for t in minority_tags]
+    index = {name: i for i, name in enumerate(sorted(set(chain.from_iterable(rows))))}
+    col_index = [[index[name] for name in row] for row in rows]
+    reduced = reduce_matrix(col_index, len(index))
+    if reduced is None:
+        return None
+    forced, live, _ = reduced
+    keep = sorted(forced + live)
+    solver = AlgorithmXBits.from_arrays([row_tags[r] for r in keep], [col_index[r] for r in keep], len(index))
+    solver.limit_rows([i for i, r in enumerate(keep) if row_tags[r] < 0], most)
+    return solver
+
+
+def components(rows, cols):
+    """
+    Split an exact cover problem into independent parts: two columns are in the same component when some row
+    covers both, so the rows of different components never clash and a cover of the whole matrix is just a cover
+    of each component put together.
+    rows - the column indices of each row
+    cols - number of columns
+    Returns a list of (columns, row numbers) for each component, in order of their first column.
+    """
+    parent = list(range(cols))
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    for row in rows:
+        row = list(row)
+        for c in row[1:]:
+            a, b = find(row[0]), find(c)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    parts = {}
+    for c in range(cols):
+        parts.setdefault(find(c), ([], []))[0].append(c)
+    for r, row in enumerate(rows):
+        if len(row) > 0:
+            parts[find(next(iter(row)))][1].append(r)
+    return list(parts.values())
+
+
+class AlgorithmXComponents(SolverBuilder):
+    """
+    Exact cover solver with the same appendRow / solve interface as AlgorithmX that first reduces the matrix (see
+    reduce_matrix), so forced rows are fixed and matrices with no covers are rejected without a search, and then
+    splits what is left into its independent components (see components), e.g. a region left in separate pieces
+    once a triplet or quad has been removed. Each component is searched once by its own solver_class solver and
+    the covers of the whole matrix are given lazily as the product of the components' covers, so the work is the
+    sum rather than the product of the components' searches. count and sample (when solver_class has them) are
+    likewise the product of the components' counts and a sample from each component.
+    As the covers are combined from a search of each component there is no single search path to carry on from, so
+    unlike AlgorithmX there is no checkpoint / save_checkpoint / resume: use AlgorithmX for runs that need to be
+    resumed (as resumable_solutions does).
+    """
+    def __init__(self, cols, solver_class=AlgorithmX):
+        assert cols >= 0, "Number of columns must be non-negative"
+        self.ncols = cols
+        self.rows = 0
+        self.row_cols = []
+        self.tags = []
+        self.solver_class = solver_class
+        self.parts = None
+        # Set by _split: whether the reduction left any covers, the tags of the forced rows and the size of the rest
+        self.feasible = True
+        self.forced = []
+        self.core = (0, 0)
+        self.cursor = None
+        self.expanded = 0
+
+    def appendRow(self, cols, tag=None):
+
+        if tag is None:
+            tag = self.rows
+        cols = sorted(set(cols))
+        for idx in cols:
+            assert 0 <= idx < self.ncols, "Column index must be between 0 and number of columns - 1"
+        self.row_cols.append(cols)
+        self.tags.append(tag)
+        self.rows += 1
+        self.parts = None
+
+    def _split(self):
+        # Reduce the matrix (see reduce_matrix) and build a solver for each component of what is left, with its
+        # columns renumbered from zero.
+        if self.parts is None:
+            self.parts = []
+            self.forced = []
+            reduced = reduce_matrix(self.row_cols, self.ncols)
+            self.feasible = reduced is not None
+            if not self.feasible:
+                return self.parts
+            forced, live, core_cols = reduced
+            self.forced = [self.tags[r] for r in forced]
+            self.core = (len(live), len(core_cols))
+            core = {c: i for i, c in enumerate(core_cols)}
+            core_rows = [[core[c] for c in self.row_cols[r]] for r in live]
+            for part_cols, part_rows in components(core_rows, len(core_cols)):
+                position = {c: i for i, c in enumerate(part_cols)}
+                solver = self.solver_class(len(part_cols))
+                for r in part_rows:
+                    solver.appendRow([position[c] for c in core_rows[r]], self.tags[live[r]])
+                self.parts.append((solver, len(part_rows)))
+            # The largest component first, as its covers are streamed rather than held (see solve)
+            self.parts.sort(key=lambda part: -part[1])
+        return self.parts
+
+    def reduced(self):
+        """
+        The row tags which are in every cover and the number of rows and columns left to search after reducing the
+        matrix (see reduce_matrix), or None if the reduction shows there are no covers.
+        """
+        self._split()
+        if not self.feasible:
+            return None
+        return (self.forced, *self.core)
+
+    def reset(self):
+        """
+        Restore the full matrix of each component (see AlgorithmX.reset).
+        """
+        for solver, _ in self._split():
+            solver.reset()
+
+    def shuffle(self, rng=None):
+        """
+        Shuffle each component's solver (see AlgorithmX.shuffle).
+        """
+        if rng is None:
+            rng = random
+        for solver, _ in self._split():
+            solver.shuffle(rng)
+
+    def n_components(self):
+        """
+        Number of independent components the matrix splits into.
+        """
+        return len(self._split())
+
+    def solve(self, limit=None, as_tuple=False, deadline=None):
+        """
+        Return a generator over the exact covers, each a list (or tuple) of row tags made up of a cover of each
+        component in turn. The covers of the largest component are streamed from its solver, as with
+        AlgorithmX.solve, and the (fewer) covers of the other components are found first and held in memory.
+        limit and deadline apply to the search of each component as for AlgorithmX.solve. self.cursor is not None
+        if any component's search was stopped early, in which case only the combinations of the covers found so
+        far are given. It is only the position (in self.parts) of the last component that was stopped, not a
+        position to carry on from (see the class docstring).
+        self.expanded is the total number of search nodes expanded.
+        """
+        return self._solve(limit=limit, as_tuple=as_tuple, deadline=deadline)
+
+    def _solve(self, limit=None, as_tuple=False, deadline=None):
+        self.cursor = None
+        self.expanded = 0
+        parts = self._split()
+        if not self.feasible:
+            return
+        forced = tuple(self.forced)
+        if len(parts) == 0:
+            yield forced if as_tuple else list(forced)
+            return
+        others = []
+        for i, (solver, _) in enumerate(parts[1:], 1):
+            solns = [tuple(s) for s in solver.solve(limit=limit, as_tuple=True, deadline=deadline)]
+            self.expanded += solver.expanded
+            if solver.cursor is not None:
+                self.cursor = i
+            if len(solns) == 0:
+                return
+            others.append(solns)
+        solver = parts[0][0]
+        for first in solver.solve(limit=limit, as_tuple=True, deadline=deadline):
+            for combination in product(*others):
+                soln = forced + tuple(first) + tuple(chain.from_iterable(combination))
+                yield soln if as_tuple else list(soln)
+        self.expanded += solver.expanded
+        if solver.cursor is not None:
+            self.cursor = 0
+
+    def count(self, memo=True, deadline=None):
+        """
+        Count the exact covers as the product of the number of covers of each component (see AlgorithmX.count).
+        """
+        parts = self._split()
+        if not self.feasible:
+            return 0
+        total = 1
+        for solver, _ in parts:
+            total *= solver.count(memo=memo, deadline=deadline)
+            if total == 0:
+                break
+        return total
+
+    def distribution(self, weights, deadline=None):
+        """
+        The exact distribution of the total weight of the rows in a cover (see AlgorithmX.distribution). The totals
+        of a cover add up over the components, so each entry's distribution is the convolution of the components'
+        distributions, shifted by the weights of the forced rows.
+        """
+        parts = self._split()
+        size = len(next(iter(weights.values())))
+        if not self.feasible:
+            return np.zeros((size, 1), dtype=object)
+        total = np.ones((size, 1), dtype=object)
+        for solver, _ in parts:
+            part = solver.distribution(weights, deadline=deadline)
+            total = np.array([np.convolve(total[p], part[p]) for p in range(size)])
+        shift = np.sum([weights[tag] for tag in self.forced], axis=0, dtype=int) if self.forced else np.zeros(size, int)
+        shifted = np.zeros((size, total.shape[1] + shift.max()), dtype=object)
+        for p in range(size):
+            shifted[p, shift[p]:shift[p] + total.shape[1]] = total[p]
+        return shifted
+
+    def sample(self, n, rng=None, deadline=None):
+        """
+        Draw n exact covers uniformly at random (with replacement) by drawing a cover of each component
+        independently and putting them together (see AlgorithmX.sample).
+        """
+        parts = self._split()
+        if not self.feasible:
+            return []
+        samples = [[self.forced] * n]
+        for solver, _ in parts:
+            part = solver.sample(n, rng=rng, deadline=deadline)
+            if len(part) == 0:
+                return []
+            samples.append(part)
+        return [list(chain.from_iterable(soln)) for soln in zip(*samples)]
+
+
+if __name__ == "__main__":
+    # Parity and timing check of the solvers (python AlgorithmX.py [height] [width]), on the domino tilings of a
+    # grid, which are like the pairs of a region: each solver must give the same covers in the same order.
+    import sys
+
+    height = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    dominoes = []
+    for i in range(height):
+        for j in range(width):
+            if j + 1 < width:
+                dominoes.append([i * width + j, i * width + j + 1])
+            if i + 1 < height:
+                dominoes.append([i * width + j, (i + 1) * width + j])
+    reference = None
+    for solver_class in (AlgorithmX, AlgorithmXArray, AlgorithmXBits):
+        solver = solver_class.from_arrays(range(len(dominoes)), dominoes, height * width)
+        start = time.time()
+        solns = list(solver.solve(as_tuple=True))
+        elapsed = time.time() - start
+        if reference is None:
+            reference = solns
+        print("{:16s} {} covers in {:.2f}s, {}".format(solver_class.__name__, len(solns), elapsed,
+                                                        "same as AlgorithmX" if solns == reference else "DIFFERENT"))
+        assert solns == reference, "{} gives different covers to AlgorithmX".format(solver_class.__name__)
+
+    # Resuming from the checkpoint of a finished search (twice over in new solvers, as reruns of a finished job
+    # would) must give no more covers and leave the checkpoint finished
+    for solver_class in (AlgorithmX, AlgorithmXBits):
+        solver = solver_class.from_arrays(range(len(dominoes)), dominoes, height * width)
+        for _ in solver.solve():
+            pass
+        checkpoint = solver.checkpoint()
+        for _ in range(2):
+            solver = solver_class.from_arrays(range(len(dominoes)), dominoes, height * width)
+            assert list(solver.resume(checkpoint)) == [], "Resuming a finished search gave more covers"
+            checkpoint = solver.checkpoint()
+            assert checkpoint['path'] is None, "Resuming a finished search left it unfinished"
+        print("{:16s} resuming a finished search twice gives no more covers".format(solver_class.__name__))
@@ -2,103 +2,439 @@
 import numpy as np
 import pandas as pd
 from AlgorithmX import *
+from algo_x import ExactCover
+from solution_store import save_solutions
+import random
 from random import sample
-from interruptingcow import timeout
+from itertools import islice
+import time
+import os
+import hashlib
+from array import array
 import sys
 import logging
 TIMEOUT = 120
+# Time allowed for counting and sampling all of the covers of a region
+SAMPLE_TIMEOUT = 300
 import gc
 
-def const_mapper(df, log=None):
+def const_mapper(df, log=None, solver_class=AlgorithmX, resample=True):
     """
     As the AlgorithmX code requires inputs starting from zero we shall take all values in the dataframes
-    and map them to ints. This function will return the solver required.
-    The df is always randomly resampled when we run this so that we get a different initial answer each time.
+    and map them to ints (with pd.factorize, in sorted order). This function will return the solver required.
+    The df is randomly resampled when we run this so that we get a different initial answer each time.
+    solver_class - the exact cover solver to build, any class with the AlgorithmX appendRow / solve interface
+    resample - set to False to keep the order of df, so the same solver is built every time (e.g. to resume a
+        checkpointed search)
     """
-    df = df.sample(len(df))
+    if resample:
+        df = df.sample(len(df))
     name_cols = get_name_cols(df)
-    const_list = np.unique(df[name_cols].stack())
-    n = len(const_list)
-    mapping = {}
-    for i in range(n):
-        mapping[const_list[i]] = i
-    for col in name_cols:
-        df = df.replace({col: mapping})
-    solver = AlgorithmX(n)
+    codes, const_list = pd.factorize(df[name_cols].values.ravel(), sort=True)
+    col_index = codes.reshape(len(df), len(name_cols))
     gc.collect()
-    for index, row in df.iterrows():
+    return solver_class.from_arrays(df['set_no'].values, col_index, len(const_list))
+
+def reservoir_sample(solutions, k, rng=None):
+    """
+    Keep a uniform random sample of (at most) k items from an iterable of unknown length in a single pass
+    (reservoir sampling), so only k items are ever held in memory.
+    rng - a random.Random instance (the random module by default)
+    Returns the sample and the number of items seen.
+    """
+    rng = random if rng is None else rng
+    reservoir = []
+    n = 0
+    for item in solutions:
+        n += 1
+        if len(reservoir) < k:
+            reservoir.append(item)
+        else:
+            i = rng.randrange(n)
+            if i < k:
+                reservoir[i] = item
+    return reservoir, n
+
+class SolutionWriter:
+    """
+    Write solutions to a gzipped csv in chunks as they are found, rather than holding every run in memory and
+    writing them all at the end. Each chunk is appended as a separate gzip member, which pandas reads back as
+    one file. The columns are fixed by the first chunk written.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.columns = None
+        self.rows = 0
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+    def write(self, df):
+        """
+        Append a dataframe of solutions to the file.
+        """
+        if df is None or len(df) == 0:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+        df[self.columns].to_csv(self.file_name, mode='a', header=self.rows == 0, index=False, compression='gzip')
+        self.rows += len(df)
+
+class SolutionHashes:
+    """
+    A compact set of the solutions found so far, shared across reruns so that solutions which have already been
+    found can be dropped as they are found again. Each solution is stored as a 64-bit hash of its sorted set_no's
+    in a sorted numpy uint64 array (8 bytes a solution, rather than a list or a Python int in a set). The hashes
+    added by a run are held in a list of arrays and merged into the sorted array once the run is finished.
+    batch_size - number of solutions hashed and looked up at once by filter
+    """
+    def __init__(self, batch_size=4096):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.pending = []
+        self.batch_size = batch_size
+        # Counts from the last call to filter
+        self.found = 0
+        self.new = 0
+
+    @staticmethod
+    def fingerprint(solution):
+        """
+        A 64-bit hash of a solution which doesn't depend on the order of its set_no's.
+        """
+        key = array('q', sorted(int(s) for s in solution)).tobytes()
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+    def _merge(self):
+        if len(self.pending) > 0:
+            self.hashes = np.union1d(self.hashes, np.concatenate(self.pending))
+            self.pending = []
+
+    def _known(self, hashes):
+        # Whether each of an array of hashes is already in the (merged) set
+        self._merge()
+        if len(self.hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        idx = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        return self.hashes[idx] == hashes
+
+    def __len__(self):
+        self._merge()
+        return len(self.hashes)
+
+    def __contains__(self, solution):
+        return bool(self._known(np.array([self.fingerprint(solution)], dtype=np.uint64))[0])
+
+    def add(self, solution):
+        self.pending.append(np.array([self.fingerprint(solution)], dtype=np.uint64))
+
+    def filter(self, solutions, add=False):
+        """
+        Generator over the solutions that are not already in the set, counting how many were found (self.found)
+        and how many of those were new (self.new). The solutions are looked up in batches of batch_size, and
+        are only compared with those found before this call, as a single search never gives the same cover twice.
+        add - also add the new solutions to the set (merged in once the solutions run out)
+        """
+        self._merge()
+        self.found = 0
+        self.new = 0
+        solutions = iter(solutions)
         try:
-            with timeout(TIMEOUT, exception=RuntimeError): 
-                solver.appendRow([r for r in row[name_cols]], row['set_no'])
-        except RuntimeError:
-            log.warning("Failed to create solver")
-            solver = None
-            break
-    return solver
+            while True:
+                batch = list(islice(solutions, self.batch_size))
+                if len(batch) == 0:
+                    break
+                hashes = np.fromiter((self.fingerprint(s) for s in batch), dtype=np.uint64, count=len(batch))
+                new = ~self._known(hashes)
+                self.found += len(batch)
+                self.new += int(new.sum())
+                if add:
+                    self.pending.append(hashes[new])
+                for solution, is_new in zip(batch, new.tolist()):
+                    if is_new:
+                        yield solution
+        finally:
+            self._merge()
 
-def return_solutions(df, max_soln = 1e7, resampled=False, log=None):
+    def unique_yield(self):
+        """
+        The proportion of the solutions found in the last call to filter which were new.
+        """
+        return self.new / self.found if self.found > 0 else 0.0
+
+def return_solutions(df, max_soln = 1e7, resampled=False, log=None, solver=None, seen=None):
     """
     This function returns the solutions from the AlgorithmX code.
-    prop - states what proportion of the solutions are returned (useful for when they get too big)
     max_soln - maximum number of solutions to derive
     resampled - is this solution being rerun
+    solver - a solver already built from df by const_mapper. It is shuffled (and restored if a previous run
+        stopped part way through) rather than rebuilt, so one solver can be reused for every rerun.
+    seen - a SolutionHashes of the solutions found by earlier runs. These are dropped before sampling, and every
+        solution found by this run is added to it (not just those kept), so that seen.unique_yield() is the
+        proportion of this run's solutions that no earlier run had found.
+    The solutions are streamed from the solver through a reservoir sample, so at most max_returned solutions
+    (or int(max_soln*0.0025) when resampled) are held in memory however many are found.
     """
     # The maximum number of solutions returned by the Algorithm X solver. If more solutions are available we shall
     # rerun but with a resampled dataframe, which, as the results are non-deterministic, should give us a 
     # different set of results.
-    max_returned = 2e6
+    max_returned = int(2e6)
+    # When rerunning only a small proportion of the solutions are kept
+    rerun_returned = int(max_soln*0.0025)
     
-    solver = const_mapper(df, log=log)
-    if solver is not None:
-        solns = 0
-        dict_solns = {}
-        try:
-            with timeout(TIMEOUT, exception=RuntimeError): 
-                # Stop calculations if taking too long, either there is no solution or having difficulty finding first one\
-                for solution in solver.solve():
-                    dict_solns[solns] = solution
-                    if solution is None:
-                        solns = 0
-                        break
-                    else:
-                        solns += 1
-                        if solns == max_soln:
-                            resampled = True # As we will be rerunning this with a 'resampled' data frame
-                            break
-                soln_returned = solns > 0
-
-                # If the result is too big take a sample. If the solution is going to be resampled take a small proportion
-                # otherwise take a larger one
-                if soln_returned:
-                    if not resampled and solns <= max_returned:
-                        sampled_solns = pd.DataFrame({'soln': dict_solns}).reset_index(drop=True)
-                    else:
-                        if not resampled:
-                            keys = sample(list(dict_solns.keys()), max_returned)
-                        else:
-                            keys = sample(list(dict_solns.keys()), int(max_soln*0.0025))
-                        dict_solns2 = {}
-                        for k in keys:
-                            dict_solns2[k] = dict_solns[k]
-                        sampled_solns = pd.DataFrame({'soln': dict_solns2}).reset_index(drop=True)
-                    # Sort out the solutions at this point to save time later.
-                    sampled_solns = sampled_solns.assign(soln = [list(np.sort(s)) for s in sampled_solns['soln']])
-                    return soln_returned, sampled_solns, resampled
-                else:
-                    return soln_returned, None, None
-        except RuntimeError:
-            log.warning("AlgorithmX took too long")
-            soln_returned = False
-            return soln_returned, None, None
+    if solver is None:
+        solver = const_mapper(df, log=log, solver_class=AlgorithmXComponents)
+    else:
+        solver.shuffle()
+    # Stop calculations if taking too long, either there is no solution or having difficulty finding first one.
+    # The solutions found before the deadline are kept.
+    solutions = islice(solver.solve(as_tuple=True, deadline=time.time() + TIMEOUT), int(max_soln))
+    if seen is not None:
+        solutions = seen.filter(solutions, add=True)
+    kept, solns = reservoir_sample(solutions, rerun_returned if resampled else max_returned)
+    if seen is not None:
+        solns = seen.found
+    if solns == max_soln:
+        resampled = True # As we will be rerunning this with a 'resampled' data frame
+    if solver.cursor is not None:
+        if log is not None:
+            log.warning(f"AlgorithmX took too long, keeping the {solns} solutions found so far")
+        resampled = True # As only some of the solutions were found we will rerun this
+    soln_returned = solns > 0
+
+    # If this run is going to be resampled only keep a small proportion (the reservoir is a uniform sample, so
+    # a sample of it is too)
+    if soln_returned:
+        if resampled and len(kept) > rerun_returned:
+            kept = sample(kept, rerun_returned)
+        # Sort out the solutions at this point to save time later.
+        sampled_solns = pd.DataFrame({'soln': [sorted(int(s) for s in k) for k in kept]})
+        return soln_returned, sampled_solns, resampled
     else:
-        soln_returned = False
         return soln_returned, None, None
 
-def to_remove_names(df):
+def _unshuffled_solver(df, minority=None, most=0, log=None):
+    """
+    The solver for df (along with the minority sets, see mixed_solver) built in the same order every time, so it
+    can be split between workers (parallel_solutions) or resumed from a checkpoint (resumable_solutions).
+    """
+    if minority is None or most == 0:
+        return const_mapper(df, log=log, resample=False)
+    return mixed_solver(df, minority, most, log=log, resample=False)
+
+def resumable_solutions(df, file_name, checkpoint_file, run_time=TIMEOUT, checkpoint_every=100000, log=None,
+                        minority=None, most=0, removed_col=None):
+    """
+    Find all of the solutions over a number of runs (e.g. separate jobs), each stopping after run_time seconds.
+    The solutions are appended to file_name (a gzipped csv) and the position of the search is saved to
+    checkpoint_file every checkpoint_every solutions and at the end of the run, so the next run (or a rerun
+    after a crash) carries on from there. Solutions found after the last checkpoint of a crashed run are found
+    again, so file_name may then contain some duplicates.
+    minority, most, removed_col - when the number of constituencies isn't divisible by the size of the sets in df,
+        the minority sets, how many of them a solution uses and the name of their column (see MIXED_COVERS and
+        parallel_solutions).
+    Returns True once all of the solutions have been found.
+    """
+    solver = _unshuffled_solver(df, minority, most, log=log)
+    if solver is None:
+        if log is not None:
+            log.warning("There are no solutions to find")
+        return True
+    deadline = time.time() + run_time
+    if os.path.exists(checkpoint_file):
+        solutions = solver.resume(load_checkpoint(checkpoint_file), deadline=deadline)
+    else:
+        solutions = solver.solve(deadline=deadline)
+
+    def write(chunk):
+        if len(chunk) > 0:
+            solns = pd.DataFrame({'soln': chunk})
+            if removed_col is not None:
+                solns = split_removed(solns, removed_col)
+            solns.to_csv(file_name, mode='a', header=not os.path.exists(file_name), index=False, compression='gzip')
+        solver.save_checkpoint(checkpoint_file)
+
+    chunk = []
+    for solution in solutions:
+        chunk.append(sorted(int(s) for s in solution))
+        if len(chunk) == checkpoint_every:
+            write(chunk)
+            chunk = []
+    write(chunk)
+    finished = solver.checkpoint()['path'] is None
+    if log is not None:
+        log.info(f"Search {'finished' if finished else 'stopped'} after expanding {solver.expanded} nodes")
+    return finished
+
+def _prefix_solutions(df, prefixes, fingerprint, minority=None, most=0, max_soln=None, deadline=None):
+    """
+    Solve the sub-problems beneath each of prefixes (from split) in a worker process for parallel_solutions. The
+    solver is rebuilt from df (in the same order) rather than sent to the worker.
+    The solutions are streamed through a reservoir sample of (at most) max_soln of them, so the worker only holds
+    that many however many are found. The time left before the deadline is shared equally between the
+    sub-problems still to search, so a large first sub-problem doesn't take all of it. Returns the (sorted)
+    solutions kept, the number found and whether every sub-problem was searched in full.
+    """
+    solver = _unshuffled_solver(df, minority, most)
+    assert solver.fingerprint() == fingerprint, "The worker built a different solver to the one that was split"
+    complete = True
+
+    def solutions():
+        nonlocal complete
+        for i, prefix in enumerate(prefixes):
+            prefix_deadline = None
+            if deadline is not None:
+                prefix_deadline = time.time() + (deadline - time.time()) / (len(prefixes) - i)
+            yield from solver.solve(prefix=prefix, as_tuple=True, deadline=prefix_deadline)
+            if solver.cursor is not None:
+                complete = False
+
+    if max_soln is None:
+        kept = list(solutions())
+        found = len(kept)
+    else:
+        kept, found = reservoir_sample(solutions(), max_soln)
+    return [sorted(int(s) for s in solution) for solution in kept], found, complete
+
+def parallel_solutions(df, n_jobs=5, depth=None, log=None, minority=None, most=0, removed_col=None,
+                       max_soln=None, run_time=None):
+    """
+    Find the solutions for a single region using n_jobs processes, by splitting the search into the sub-problems
+    below its first depth branching choices and solving these in a process pool. By default depth is increased
+    until there are at least 8 sub-problems per job, so that one slow branch doesn't leave the other processes
+    idle. The sub-problems are dealt out round-robin into batches (so each worker builds the solver once per batch),
+    4 per job, or one per job when there is a run_time, as every process is then busy until the end anyway.
+    Generator over a dataframe of (sorted) solutions for each batch, in the order the batches finish, so they can
+    be written out (e.g. with a SolutionWriter, see get_parallel_solns) without holding them all in memory.
+    minority, most, removed_col - when the number of constituencies isn't divisible by the size of the sets in df,
+        the minority sets, how many of them a solution uses and the name of their column (see MIXED_COVERS). The
+        solutions are then the covers using up to `most` of them (see mixed_solver), with the minority sets used in
+        removed_col.
+    max_soln - keep a uniform random sample of at most this many solutions from each batch (see reservoir_sample)
+    run_time - stop the search after this many seconds, keeping the solutions found by then
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    solver = _unshuffled_solver(df, minority, most, log=log)
+    if solver is None:
+        if log is not None:
+            log.warning("There are no solutions to split")
+        return
+    if depth is None:
+        n = get_n(df, get_name_cols(df))
+        depth = 1
+        prefixes = solver.split(depth)
+        while len(prefixes) < 8 * n_jobs and depth < n:
+            depth += 1
+            deeper = solver.split(depth)
+            if len(deeper) == len(prefixes):
+                break
+            prefixes = deeper
+    else:
+        prefixes = solver.split(depth)
+    if log is not None:
+        log.info(f"Split the search into {len(prefixes)} sub-problems at depth {depth}")
+    n_batches = min(n_jobs if run_time is not None else 4 * n_jobs, len(prefixes))
+    deadline = None if run_time is None else time.time() + run_time
+    found = 0
+    complete = True
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(_prefix_solutions, df, prefixes[i::n_batches], solver.fingerprint(), minority, most,
+                               max_soln, deadline) for i in range(n_batches)]
+        for future in as_completed(futures):
+            solns, batch_found, batch_complete = future.result()
+            found += batch_found
+            complete = complete and batch_complete
+            solns = pd.DataFrame({'soln': solns})
+            yield solns if removed_col is None else split_removed(solns, removed_col)
+    if log is not None:
+        log.info(f"{found} solutions found by the {n_batches} batches")
+        if not complete:
+            log.warning(f"The search stopped after {run_time}s, keeping the solutions found so far")
+
+def best_solutions(df, costs, k=10, run_time=TIMEOUT, log=None, minority=None, minority_costs=None, most=0,
+                   removed_col=None):
+    """
+    The k solutions with the lowest total cost (e.g. the most even electorates, see set_votes.imbalance_costs)
+    found by branch and bound (see AlgorithmX.optimise), stopping after run_time seconds with the best found by
+    then.
+    costs - dict from set_no to the cost of that set
+    minority, minority_costs, most, removed_col - when the number of constituencies isn't divisible by the size of
+        the sets in df, the minority sets, their costs, how many of them a solution uses and the name of their
+        column (see MIXED_COVERS), e.g. for the London or South East quads. The solutions are then the covers using
+        up to `most` of the minority sets (see mixed_solver), with the minority sets used in removed_col.
+    Returns a dataframe with the (sorted) solution and its cost, cheapest first.
+    """
+    if minority is None or most == 0:
+        solver = const_mapper(df, log=log, resample=False)
+    else:
+        solver = mixed_solver(df, minority, most, log=log, resample=False)
+        # The minority sets are tagged with their negative set_no (and their set_no's overlap with those in df)
+        costs = {**costs, **{-s: c for s, c in minority_costs.items()}}
+    if solver is None:
+        top = []
+    else:
+        top = solver.best(costs, k, deadline=time.time() + run_time)
+        if not solver.finished and log is not None:
+            log.warning(f"Stopped the search for the best solutions after {run_time}s, keeping the best found so far")
+    solns = pd.DataFrame({'soln': [sorted(int(s) for s in soln) for _, soln in top],
+                          'cost': [cost for cost, _ in top]})
+    if minority is None or most == 0:
+        return solns
+    return split_removed(solns, removed_col)
+
+def sample_solutions(df, n_samples, log=None, deadline=None):
+    """
+    Draw n_samples solutions uniformly at random from all of the exact covers of df in a single pass, instead of
+    truncating and rerunning return_solutions on reshuffled dataframes.
+    Returns a dataframe with one (sorted) solution per row, or None if there are no solutions.
+    deadline - wall-clock time (as given by time.time()) after which a TimeoutError is raised
+    """
+    solver = const_mapper(df, log=log, solver_class=AlgorithmXComponents)
+    solns = solver.sample(n_samples, deadline=deadline)
+    if len(solns) == 0:
+        return None
+    return pd.DataFrame({'soln': [sorted(int(t) for t in s) for s in solns]})
+
+def check_solver_parity(df, solver_classes=(AlgorithmX, AlgorithmXArray, AlgorithmXBits, AlgorithmXComponents),
+                        log=None, minority=None, most=0):
     """
-    from the randomly selected 'set_no' put the names that will be removed into a list
+    Check that each of the solvers in solver_classes returns exactly the same solutions as the algo_x ExactCover
+    code for a dataframe of pairs / triplets / quads (already filtered to a single region).
+    minority, most - check the mixed covers using up to `most` of the minority sets instead (see MIXED_COVERS), for
+        a region whose number of constituencies isn't divisible by the size of the sets in df. The solvers are
+        built from both sets of rows and their covers using more than `most` minority sets are dropped, and
+        mixed_solver (which leaves those out itself) is checked as well.
+    Returns True if all of the solvers agree, otherwise False (with a warning logged for each solver that differs).
+    There is nothing to compare when the reference has no solutions (e.g. a region that needs a mixed cover checked
+    without its minority sets), so that is a warning and False too.
     """
-    return df.loc[:, df.columns.str.startswith('name')].values.tolist()[0]
+    sets = list(zip(df['set_no'], df[get_name_cols(df)].values.tolist()))
+    if minority is not None:
+        sets += [(-s, r) for s, r in zip(minority['set_no'], minority[get_name_cols(minority)].values.tolist())]
+
+    def allowed(solution):
+        return sum(s < 0 for s in solution) <= most
+
+    reference = {frozenset(s) for s in ExactCover(dict(sets)) if allowed(s)}
+    if len(reference) == 0:
+        if log is not None:
+            log.warning("The algo_x code found no solutions, so there is nothing to compare the solvers with.")
+        return False
+    index = {name: i for i, name in enumerate(sorted({name for _, r in sets for name in r}))}
+    solvers = []
+    for solver_class in solver_classes:
+        # A different row order for each solver (as const_mapper resamples df)
+        shuffled = sample(sets, len(sets))
+        solvers.append((solver_class.__name__, solver_class.from_arrays(
+            [s for s, _ in shuffled], [[index[name] for name in r] for _, r in shuffled], len(index))))
+    if minority is not None:
+        solvers.append(("mixed_solver", mixed_solver(df, minority, most, log=log)))
+    agree = True
+    for name, solver in solvers:
+        solns = [frozenset(s) for s in solver.solve() if allowed(s)]
+        if len(solns) != len(set(solns)) or set(solns) != reference:
+            if log is not None:
+                log.warning(f"{name} returned {len(solns)} solutions, expected {len(reference)}.")
+            agree = False
+    return agree
 
 def get_n(df, name_cols):
     """
@@ -107,106 +443,12 @@ def get_n(df, name_cols):
     const_list = np.unique(df[name_cols].stack())
     return len(const_list)
 
-def remove_consts(df, to_remove, name_cols):
-    """
-    Given a list of constituencies (to_remove) remove all rows from dataframe which contain them
-    """
-    for name in name_cols:
-        df = df[~df[name].isin(to_remove)]
-    return df
-
 def get_name_cols(df):
     """
     Return all columns that start with the word 'name'
     """
     return df.columns[df.columns.str.startswith('name')]
 
-def remove_random_const(const_pairs, const_tris, const_quads, seats, region, n, log):
-    """
-    This function removes randomly selected pairs / triplets / quadruplets to make sure
-    that the number of constituencies left are divisble by the number of seats.
-    """
-    n2 = n # Check that the number of remaining constituencies are divisible by n
-    if seats == 2:
-        name_cols = get_name_cols(const_pairs)
-    elif seats == 3:
-        name_cols = get_name_cols(const_tris)
-    elif seats == 4:
-        name_cols = get_name_cols(const_quads)
-    removed = {}
-    # How many constituencies are removed to make the number remaining divisbile by 'seats'?
-    if seats == 2:
-        n3 = n2 - 3
-    elif (seats == 3) & (n % seats == 1):
-        n3 = n2 - 4
-    elif (seats == 3) & (n % seats == 2):
-        n3 = n2 - 2
-    elif seats == 4:
-        if n % seats == 1:
-            n3 = n2 - 9 # Three triplets are removed
-        elif n % seats == 2:
-            n3 = n2 - 6 # Two triplets are removed
-        elif n % seats == 3:
-            n3 = n2 - 3
-    if seats == 2:
-        while n3 != n2:
-            df = const_pairs.copy()
-            random_const = const_tris.sample(1)
-            log.info(f"Removed {random_const['set_no']} from const_tris")
-            removed['triplet'] = random_const['set_no'].iloc[0]
-            to_remove = to_remove_names(random_const)
-            df = remove_consts(df, to_remove, name_cols)
-            n2 = get_n(df, name_cols)
-    elif seats == 3:
-        while n3 != n2:
-            df = const_tris.copy()
-            if (seats == 3) & (n % seats == 1):
-                random_const = const_quads.sample(1)
-                log.info(f"Removed {random_const['set_no']} from const_quads")
-                removed['quad'] = random_const['set_no'].iloc[0]
-                to_remove = to_remove_names(random_const)
-            elif (seats == 3) & (n % seats == 2):
-                random_const = const_pairs.sample(1)
-                log.info(f"Removed {random_const['set_no']} from const_pairs")
-                removed['pair'] = random_const['set_no'].iloc[0]
-                to_remove = to_remove_names(random_const)
-            df = remove_consts(df, to_remove, name_cols)
-            n2 = get_n(df, name_cols)
-    elif seats == 4:
-        while n3 != n2:
-            df = const_quads.copy()
-            # Need to ensure that when we remove multiple triplets that none of the elements are repeated
-            if (n % seats == 2) or (n % seats == 1):
-                df2 = const_tris.copy()
-                name_cols2 = df2.columns[df2.columns.str.startswith('name')]
-                if n % seats == 1:
-                    # remove 3 triplets
-                    trips = 3
-                elif n % seats == 2:
-                    # remove 2 triplets
-                    trips = 2
-                to_remove = []
-                for i in range(trips):
-                    random_const = df2.sample(1)
-                    if i == 0:
-                        removed['triplet'] = [random_const['set_no'].iloc[0]]
-                    else:
-                        removed['triplet'] = [*removed['triplet'], random_const['set_no'].iloc[0]]
-                    to_remove = to_remove + to_remove_names(random_const)
-                    # Make sure we only remove applicable sets 
-                    for name in name_cols2:
-                        df2 = df2[~df2[name].isin(to_remove)]
-                removed['triplet'] = list(np.sort(removed['triplet']))
-            elif n % seats == 3:
-                random_const = const_tris.sample(1)
-                removed['triplet'] = random_const['set_no'].iloc[0]
-                to_remove = to_remove_names(random_const)
-            log.info(f"Removed {removed['triplet']} from const_quads")
-            df = remove_consts(df, to_remove, name_cols)
-            n2 = get_n(df, name_cols)
-
-    return df, removed
-
 def custom_logger(logger_name, level=logging.DEBUG):
     """
     Method to return a custom logger with the given name and level
@@ -225,9 +467,43 @@ def custom_logger(logger_name, level=logging.DEBUG):
     logger.addHandler(file_handler)
     return logger
 
+def mixed_solver(df, minority, most, log=None, resample=True):
+    """
+    Build a solver for the covers made of the sets in df along with up to `most` of the sets in minority, e.g. the
+    pairs of a region with an odd number of constituencies along with one triplet (see mixed_cover_solver and
+    MIXED_COVERS), so one search covers every possible removal.
+    The minority sets are tagged with their negative set_no (see split_removed). Like const_mapper the solver is
+    randomly shuffled unless resample is False.
+    The matrix is reduced first, dropping the sets which can't be in any cover, and None is returned if the
+    reduction shows there are no covers at all.
+    """
+    minority_cols = get_name_cols(minority)
+    solver = mixed_cover_solver(df['set_no'].values, df[get_name_cols(df)].values,
+                                minority['set_no'].values, minority[minority_cols].values, most)
+    if solver is None:
+        return None
+    if log is not None:
+        log.info(f"Reduced the {len(df) + len(minority)} sets to {solver.rows}.")
+    if resample:
+        solver.shuffle()
+    return solver
+
+def split_removed(solns, removed_col):
+    """
+    Split each of the solutions from a mixed_solver into the set_no's of the sets in the cover (soln) and of the
+    minority sets it uses (removed_col), the set_no as a string or, for more than one, a string of the sorted list.
+    """
+    removed = [sorted(-s for s in soln if s < 0) for soln in solns['soln']]
+    solns = solns.assign(soln = [[s for s in soln if s > 0] for soln in solns['soln']])
+    solns[removed_col] = [str(r[0]) if len(r) == 1 else str(r) for r in removed]
+    return solns
+
 def get_solns(const_pairs, const_tris, const_quads, seats, region, max_solns=1e6):
     """
-    Find the solutions, or a subset of them, and saves them into a csv file
+    Find the solutions, or a subset of them, and saves them into a csv file.
+    When the number of constituencies isn't divisible by `seats` the covers that also use the minority sets in
+    MIXED_COVERS are searched for in one go (see mixed_solver), rather than searching again for each of a number of
+    random removals, and the minority sets used are saved in their own column.
     """
     const_pairs2 = const_pairs.query("region == @region")
     const_tris2 = const_tris.query("region == @region")
@@ -241,101 +517,143 @@ def get_solns(const_pairs, const_tris, const_quads, seats, region, max_solns=1e6
     name_cols = get_name_cols(df)
     # How many times should we rerun Algorithm X when we cannot return all solutions.
     RERUN_COUNTER = 40 * (1 + (seats >= 4))
-    # How many times should we rerun Algorithm X when we have to remove a random constituency set so that the 
-    # number of constituencies left are divisible by `seats`.
-    COUNTER = 30 * (1 + (seats >= 4))
-    LONG_TIMEOUT = 300
+    # Stop rerunning once fewer than this proportion of the solutions found by a rerun are new.
+    MIN_YIELD = 0.05
     
     n = get_n(df, name_cols)
     r = region.replace(" ", "_")
     file_name = f"Solutions/solns_{r}_{seats}.csv.gz"
     log_file_name = f"Logs/log_{r}_{seats}.log"
     log = custom_logger(log_file_name)
+    # Each run's solutions are written out as soon as they are found rather than concatenated at the end
+    writer = SolutionWriter(file_name)
+    # The solutions found so far, so the duplicates found by reruns are dropped before they are written
+    seen = SolutionHashes()
+    # Build the solver once and reuse it (reshuffled) for every rerun
     if n % seats == 0:
-        try:
-            with timeout(LONG_TIMEOUT, exception=RuntimeError): 
-                soln_returned, solns, resampled = return_solutions(df, resampled=False, max_soln=max_solns, log=log)
-        except RuntimeError:
-                log.warning(f"For the {region} region, when we have {seats} seats there is a timeout.")
-                soln_returned = False
-        if soln_returned:
-            if len(solns) <= 1 or solns is None:
-                log.warning(f"For the {region} region, when we have {seats} seats there are no solutions.")
-            else:
-                # If we're unable to get all solutions rerun multiple times to get a further subset of them.
-                if resampled:
-                    d = {}
-                    d[0] = solns.copy()
-                    j = 0
-                    while j < RERUN_COUNTER:
-                        log.info(f"At j = {j}.") 
-                        try:
-                            with timeout(LONG_TIMEOUT, exception=RuntimeError): 
-                                soln_returned, d[j], resampled = return_solutions(df, resampled=True, max_soln=max_solns, log=log)
-                        except RuntimeError:
-                                log.warning(f"For the {region} region, when we have {seats} seats there is a timeout.")
-                                soln_returned = False
-                        if soln_returned:
-                            j += 1
-                    if soln_returned:
-                        try:
-                            solns = pd.concat(d, ignore_index=True)
-                        except:
-                            log.warning(f"For region {region} with seats = {seats} we cannot concatenate.")
-        else:
-            log.warning(f"Issue with the {region} region, when we have {seats} seats there are no solutions returned.")
+        # The region is searched in independent components where it splits into separate pieces
+        removed_col = None
+        solver = const_mapper(df, log=log, solver_class=AlgorithmXComponents)
     else:
-        # Get the solutions multiple times with different random elements removed.
-        soln_dict = {}
-        i = 0
-        while i < COUNTER:
-            log.info(f"At i = {i}.")
-            df, removed = remove_random_const(const_pairs2, const_tris2, const_quads2, seats, region, n, log)
-            try:
-                with timeout(LONG_TIMEOUT, exception=RuntimeError): 
-                    soln_returned, soln_dict[i], resampled = return_solutions(df, resampled=False, max_soln=max_solns, log=log)
-            except RuntimeError:
-                log.warning(f"For the {region} region, when we have {seats} seats there is a timeout.")
-                soln_returned = False
-            if soln_returned:
-                if resampled:
-                    d = {}
-                    d[0] = soln_dict[i].copy()
-                    j = 0
-                    while j < RERUN_COUNTER: # and soln_returned:
-                        log.info(f"At j = {j}.")
-                        try:
-                            with timeout(LONG_TIMEOUT, exception=RuntimeError): 
-                                soln_returned, d[j], resampled = return_solutions(df, resampled=True, max_soln=max_solns, log=log)
-                        except RuntimeError:
-                                log.warning(f"For the {region} region, when we have {seats} seats there is a timeout.")
-                                soln_returned = False
-                        if soln_returned:
-                            j += 1
-                    if soln_returned:
-                        try:
-                            soln_dict[i] = pd.concat(d, ignore_index=True)
-                        except:
-                            log.warning(f"For region {region} with seats = {seats} we cannot concatenate.")
-            if soln_returned:
-                try:
-                    # Add in the set_no's that were removed from the solutions
-                    soln_dict[i][list(removed.keys())[0]] = str(list(removed.values())[0])
-                    i += 1
-                except:
-                    for k in range(len(soln_dict)):
-                        log.warning(f"{k}: {soln_dict[k].shape}")
-                    log.warning(f"For region {region} with seats = {seats} we cannot add in the removed solutions.")
-        try:
-            solns = pd.concat(soln_dict, ignore_index=True)
-        except:
-            for k in range(len(soln_dict)):
-                log.warning(f"{k}: {soln_dict[k].shape}")
-            log.warning(f"For region {region} with seats = {seats} we cannot concatenate solutions.")
+        removed_col, most = MIXED_COVERS[(seats, n % seats)]
+        minority = {'pair': const_pairs2, 'triplet': const_tris2, 'quad': const_quads2}[removed_col]
+        log.info(f"Covering with up to {most} {removed_col}(s) as there are {n} constituencies.")
+        solver = mixed_solver(df, minority, most, log=log)
+        if solver is None:
+            log.warning(f"For the {region} region, when we have {seats} seats there are no solutions.")
+            return
+
+    def write(solns):
+        if removed_col is not None:
+            solns = split_removed(solns, removed_col)
+        writer.write(solns.assign(region = region))
+
+    soln_returned, solns, resampled = return_solutions(df, resampled=False, max_soln=max_solns, log=log, solver=solver, seen=seen)
+    if soln_returned:
+        if len(solns) <= 1 or solns is None:
+            log.warning(f"For the {region} region, when we have {seats} seats there are no solutions.")
+        write(solns)
+        # If we're unable to get all solutions rerun multiple times to get a further subset of them.
+        if resampled:
+            j = 0
+            while j < RERUN_COUNTER:
+                log.info(f"At j = {j}.") 
+                soln_returned, solns, resampled = return_solutions(df, resampled=True, max_soln=max_solns, log=log, solver=solver, seen=seen)
+                if soln_returned:
+                    write(solns)
+                    j += 1
+                    log.info(f"{seen.new} of the {seen.found} solutions found were new ({len(seen)} found so far).")
+                    if seen.unique_yield() < MIN_YIELD:
+                        log.info(f"Stopping the reruns as the proportion of new solutions is below {MIN_YIELD}.")
+                        break
+    else:
+        log.warning(f"Issue with the {region} region, when we have {seats} seats there are no solutions returned.")
+    if writer.rows > 0:
+        log.info(f"Finished getting solutions for region {region} with {seats} seats")
+    else:
+        log.warning(f"Cannot get solutions for region {region} with {seats} seats")
+
+def get_sampled_solns(const_pairs, const_tris, const_quads, seats, region, n_samples=25000):
+    """
+    Sample n_samples solutions uniformly at random and save them directly into the SampledSolutions folder.
+    When the number of constituencies is not divisible by `seats` the samples are drawn from the covers which also
+    use the minority sets in MIXED_COVERS (see mixed_solver), so every (removed sets, cover) pair is equally likely,
+    as with get_solns, and the removed sets are saved in their own column.
+    """
+    const_pairs2 = const_pairs.query("region == @region")
+    const_tris2 = const_tris.query("region == @region")
+    const_quads2 = const_quads.query("region == @region")
+    if seats == 2:
+        df = const_pairs2
+    elif seats == 3:
+        df = const_tris2
+    elif seats == 4:
+        df = const_quads2
+    name_cols = get_name_cols(df)
+
+    n = get_n(df, name_cols)
+    r = region.replace(" ", "_")
+    file_name = f"../Analysis/Data/SampledSolutions/sampled_solns_{r}_{seats}.npz"
+    log_file_name = f"Logs/log_{r}_{seats}.log"
+    log = custom_logger(log_file_name)
+    solns = None
     try:
-        if len(solns) > 0:
-            solns = solns.assign(region = region)
-            solns.to_csv(file_name, index=False, compression='gzip')
-            log.info(f"Finished getting solutions for region {region} with {seats} seats")
-    except:
+        if n % seats == 0:
+            solns = sample_solutions(df, n_samples, log=log, deadline=time.time() + SAMPLE_TIMEOUT)
+        else:
+            removed_col, most = MIXED_COVERS[(seats, n % seats)]
+            minority = {'pair': const_pairs2, 'triplet': const_tris2, 'quad': const_quads2}[removed_col]
+            solver = mixed_solver(df, minority, most, log=log)
+            sampled = [] if solver is None else solver.sample(n_samples, deadline=time.time() + SAMPLE_TIMEOUT)
+            if len(sampled) > 0:
+                solns = split_removed(pd.DataFrame({'soln': [sorted(int(t) for t in s) for s in sampled]}),
+                                      removed_col)
+    except TimeoutError:
+        log.warning(f"For the {region} region, when we have {seats} seats there is a timeout.")
+    if solns is not None:
+        save_solutions(solns.assign(region = region), file_name)
+        log.info(f"Finished sampling solutions for region {region} with {seats} seats")
+    else:
+        log.warning(f"Cannot get solutions for region {region} with {seats} seats")
+
+def get_parallel_solns(const_pairs, const_tris, const_quads, seats, region, n_jobs=5, max_solns=1e6,
+                       run_time=TIMEOUT):
+    """
+    Find the solutions, or a uniform random sample of them, with parallel_solutions and save them into the same
+    csv file as get_solns, writing each batch out as soon as it finishes. When the number of constituencies isn't
+    divisible by `seats` the covers also use the minority sets in MIXED_COVERS (e.g. for the London quads), which
+    are saved in their own column.
+    max_solns - keep at most about this many solutions, sampled uniformly from each of the batches
+    run_time - stop the search after this many seconds, keeping the solutions found by then
+    """
+    const_pairs2 = const_pairs.query("region == @region")
+    const_tris2 = const_tris.query("region == @region")
+    const_quads2 = const_quads.query("region == @region")
+    if seats == 2:
+        df = const_pairs2
+    elif seats == 3:
+        df = const_tris2
+    elif seats == 4:
+        df = const_quads2
+    name_cols = get_name_cols(df)
+
+    n = get_n(df, name_cols)
+    r = region.replace(" ", "_")
+    file_name = f"Solutions/solns_{r}_{seats}.csv.gz"
+    log_file_name = f"Logs/log_{r}_{seats}.log"
+    log = custom_logger(log_file_name)
+    writer = SolutionWriter(file_name)
+    minority, most, removed_col = None, 0, None
+    if n % seats != 0:
+        removed_col, most = MIXED_COVERS[(seats, n % seats)]
+        minority = {'pair': const_pairs2, 'triplet': const_tris2, 'quad': const_quads2}[removed_col]
+        log.info(f"Covering with up to {most} {removed_col}(s) as there are {n} constituencies.")
+    # Each of the n_jobs batches keeps its share of the solutions
+    max_soln = int(max_solns / n_jobs)
+    for solns in parallel_solutions(df, n_jobs=n_jobs, log=log, minority=minority, most=most,
+                                    removed_col=removed_col, max_soln=max_soln, run_time=run_time):
+        writer.write(solns.assign(region = region))
+    if writer.rows > 0:
+        log.info(f"Finished getting solutions for region {region} with {seats} seats")
+    else:
         log.warning(f"Cannot get solutions for region {region} with {seats} seats")
@@ -0,0 +1,227 @@
+# Storing and loading sets of solutions as integer matrices rather than csv files of stringified lists
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+# Columns holding the set_no's that were removed so that the number of constituencies was divisible by seats
+REMOVED_COLUMNS = ['pair', 'triplet', 'quad']
+
+def _to_list(value):
+    """
+    Convert a set_no, a list of them or a stringified list of them (as written to csv) into a list of ints
+    """
+    if isinstance(value, str):
+        return [int(v) for v in value.strip("[]").split(",") if v.strip() != ""]
+    if np.ndim(value) == 0:
+        return [int(value)]
+    return [int(v) for v in value]
+
+def _to_matrix(values):
+    """
+    Stack lists of set_no's into a matrix with one row per solution, padding shorter rows with -1. The smallest
+    integer type that will hold the set_no's is used.
+    """
+    rows = [_to_list(v) for v in values]
+    width = max((len(r) for r in rows), default=0)
+    largest = max((max(r) for r in rows if len(r) > 0), default=0)
+    matrix = np.full((len(rows), width), -1, dtype=np.int16 if largest < 2**15 else np.int32)
+    for i, r in enumerate(rows):
+        matrix[i, :len(r)] = r
+    return matrix
+
+class Solutions:
+    """
+    A set of solutions for a region, held as integer matrices.
+    soln - matrix with one row per solution of the set_no's chosen (padded with -1 if the solutions differ in size)
+    removed - dict from the removed set columns (pair / triplet / quad) to matrices of the set_no's removed
+    regions - the region names, with region_code giving the index of each solution's region
+    """
+    def __init__(self, soln, removed, regions, region_code):
+        self.soln = soln
+        self.removed = removed
+        self.regions = regions
+        self.region_code = region_code
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build from a dataframe of solutions (as written by get_solns / get_sampled_solns) with a 'soln' column of
+        set_no lists, the removed set columns if any and the 'region'. Stringified lists (from csv) are parsed.
+        """
+        removed = {col: _to_matrix(df[col]) for col in REMOVED_COLUMNS if col in df.columns}
+        region_code, regions = pd.factorize(df['region'])
+        return cls(_to_matrix(df['soln']), removed, np.asarray(regions, dtype=str), region_code.astype(np.int16))
+
+    def __len__(self):
+        return self.soln.shape[0]
+
+    @property
+    def region(self):
+        """
+        The region of each solution
+        """
+        return self.regions[self.region_code]
+
+    def to_frame(self):
+        """
+        Return the solutions in the layout of the csv files (a list of set_no's per solution). A removed column
+        with a single set_no per solution is given as ints, otherwise as lists.
+        """
+        df = pd.DataFrame({'soln': [[int(s) for s in row if s >= 0] for row in self.soln]})
+        for col, matrix in self.removed.items():
+            if matrix.shape[1] == 1:
+                df[col] = matrix[:, 0].astype(np.int64)
+            else:
+                df[col] = [[int(s) for s in row if s >= 0] for row in matrix]
+        df['region'] = self.region
+        return df
+
+    def save(self, file_name):
+        """
+        Save as a compressed .npz file of integer matrices.
+        """
+        np.savez_compressed(file_name, soln=self.soln, regions=self.regions, region_code=self.region_code,
+                            **self.removed)
+
+def save_solutions(df, file_name):
+    """
+    Save a dataframe of solutions (see Solutions.from_frame) as a compressed .npz file.
+    """
+    Solutions.from_frame(df).save(file_name)
+
+def load_solutions(file_name):
+    """
+    Load solutions saved by save_solutions. A csv file in the old format (stringified lists) can also be given.
+    """
+    if file_name.endswith(".csv") or file_name.endswith(".csv.gz"):
+        return Solutions.from_frame(pd.read_csv(file_name, dtype={'region': str}))
+    with np.load(file_name) as f:
+        removed = {col: f[col] for col in REMOVED_COLUMNS if col in f.files}
+        return Solutions(f['soln'], removed, f['regions'], f['region_code'])
+
+def convert_csv(file_name):
+    """
+    Convert a csv file of solutions into the .npz format, returning the name of the new file.
+    """
+    new_name = file_name.replace(".csv.gz", ".npz").replace(".csv", ".npz")
+    load_solutions(file_name).save(new_name)
+    return new_name
+
+def _solution_files(directory):
+    """
+    The sampled_solns_{region}_{seats}.npz files in a directory, as a dict from (region, seats) to file name
+    """
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        match = re.match("sampled_solns_(.+)_([0-9]+)\\.npz$", name)
+        if match:
+            files[(match.group(1).replace("_", " "), int(match.group(2)))] = os.path.join(directory, name)
+    return files
+
+def build_store(solutions_dir, store_dir):
+    """
+    Consolidate all of the sampled solution files in solutions_dir into a single store in store_dir which can be
+    memory-mapped (see SolutionStore). The set_no's are held in two flat arrays (solutions.npy and removed.npy)
+    with each (region, seats) block stored contiguously, and index.json giving the offset and shape of each block.
+    Within a block the solutions are sorted by their removed sets, so the solutions for each removed set are
+    also contiguous.
+    """
+    blocks = []
+    for (region, seats), file_name in _solution_files(solutions_dir).items():
+        s = load_solutions(file_name)
+        removed_column = next(iter(s.removed), None)
+        removed = s.removed[removed_column] if removed_column is not None else np.zeros((len(s), 0), dtype=np.int16)
+        # Put the set_no's removed from each solution in order (with the -1 padding last), so that a removal is
+        # grouped together however its set_no's were listed
+        padded = np.where(removed < 0, np.iinfo(removed.dtype).max, removed)
+        removed = np.sort(padded, axis=1)
+        removed[removed == np.iinfo(removed.dtype).max] = -1
+        order = np.lexsort(removed.T[::-1]) if removed.shape[1] > 0 else np.arange(len(s))
+        blocks.append((region, seats, removed_column, s.soln[order], removed[order]))
+    largest = max([max(b[3].max(initial=0), b[4].max(initial=0)) for b in blocks], default=0)
+    dtype = np.int16 if largest < 2**15 else np.int32
+    os.makedirs(store_dir, exist_ok=True)
+    soln_out = np.lib.format.open_memmap(os.path.join(store_dir, "solutions.npy"), mode='w+', dtype=dtype,
+                                         shape=(sum(b[3].size for b in blocks),))
+    removed_out = np.lib.format.open_memmap(os.path.join(store_dir, "removed.npy"), mode='w+', dtype=dtype,
+                                            shape=(sum(b[4].size for b in blocks),))
+    index = []
+    soln_offset = removed_offset = 0
+    for region, seats, removed_column, soln, removed in blocks:
+        soln_out[soln_offset:soln_offset + soln.size] = soln.ravel()
+        removed_out[removed_offset:removed_offset + removed.size] = removed.ravel()
+        # The rows where each removed set starts
+        groups = []
+        for i in range(len(removed)):
+            if i == 0 or (removed[i] != removed[i - 1]).any():
+                groups.append([[int(r) for r in removed[i] if r >= 0], i])
+        index.append({'region': region, 'seats': seats, 'rows': soln.shape[0], 'soln_offset': soln_offset,
+                      'soln_width': soln.shape[1], 'removed_column': removed_column,
+                      'removed_offset': removed_offset, 'removed_width': removed.shape[1], 'removed_groups': groups})
+        soln_offset += soln.size
+        removed_offset += removed.size
+    soln_out.flush()
+    removed_out.flush()
+    del soln_out, removed_out
+    with open(os.path.join(store_dir, "index.json"), "w") as f:
+        json.dump(index, f)
+
+class SolutionStore:
+    """
+    A store built by build_store, memory-mapped read only so that slices are views onto the file (nothing is
+    copied or decompressed) and processes reading the same store share the same pages.
+    """
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, "index.json")) as f:
+            self.index = {(b['region'], b['seats']): b for b in json.load(f)}
+        self.solutions = np.load(os.path.join(store_dir, "solutions.npy"), mmap_mode='r')
+        self.removed = np.load(os.path.join(store_dir, "removed.npy"), mmap_mode='r')
+
+    def keys(self):
+        """
+        The (region, seats) blocks in the store
+        """
+        return list(self.index.keys())
+
+    def removed_sets(self, region, seats):
+        """
+        The different sets removed from the (region, seats) solutions (empty if nothing was removed)
+        """
+        return [g[0] for g in self.index[(region, seats)]['removed_groups'] if len(g[0]) > 0]
+
+    def get(self, region, seats, removed=None):
+        """
+        Return the (region, seats) solutions as a Solutions object whose matrices are views onto the store.
+        removed - only return the solutions where this set_no (or list of set_no's, in any order) was removed.
+            A KeyError is raised if it was never removed from the (region, seats) solutions.
+        """
+        b = self.index[(region, seats)]
+        start, stop = 0, b['rows']
+        if removed is not None:
+            groups = b['removed_groups']
+            target = sorted(_to_list(removed))
+            starts = [g[1] for g in groups] + [b['rows']]
+            matches = [i for i, g in enumerate(groups) if sorted(g[0]) == target]
+            if len(matches) == 0:
+                raise KeyError(f"{target} was not removed from any of the {region} solutions with {seats} seats")
+            start, stop = starts[matches[0]], starts[matches[0] + 1]
+        soln = self.solutions[b['soln_offset']:b['soln_offset'] + b['rows'] * b['soln_width']]
+        soln = soln.reshape(b['rows'], b['soln_width'])[start:stop]
+        removed_sets = {}
+        if b['removed_column'] is not None:
+            matrix = self.removed[b['removed_offset']:b['removed_offset'] + b['rows'] * b['removed_width']]
+            removed_sets[b['removed_column']] = matrix.reshape(b['rows'], b['removed_width'])[start:stop]
+        return Solutions(soln, removed_sets, np.array([region]), np.broadcast_to(np.int16(0), (stop - start,)))
+
+def open_store(solutions_dir, store_dir):
+    """
+    Open the store of the solutions in solutions_dir, (re)building it first if it is missing or any of the
+    solution files have changed since it was built.
+    """
+    index_file = os.path.join(store_dir, "index.json")
+    files = _solution_files(solutions_dir).values()
+    if not os.path.exists(index_file) or \
+            any(os.path.getmtime(f) > os.path.getmtime(index_file) for f in files):
+        build_store(solutions_dir, store_dir)
+    return SolutionStore(store_dir)
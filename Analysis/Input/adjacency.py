@@ -0,0 +1,69 @@
+# Finding neighbouring constituencies (those that share a border) and the connected sets of them
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+def file_checksum(file_names):
+    """
+    sha1 of the contents of the given files (e.g. the .shp / .dbf / .shx of a shapefile)
+    """
+    h = hashlib.sha1()
+    for file_name in file_names:
+        with open(file_name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+def neighbour_pairs(geometries):
+    """
+    Return the pairs (i, j), i < j, of the geometries that are not disjoint, in order of i then j.
+    An STRtree of the bounding boxes is used so that the (expensive) polygon test is only done on geometries whose
+    bounding boxes overlap, rather than on every pair.
+    """
+    geometries = list(geometries)
+    tree = STRtree(geometries)
+    # Older versions of shapely return the geometries from a query rather than their positions
+    position = {id(g): i for i, g in enumerate(geometries)}
+    pairs = []
+    for i, geometry in enumerate(geometries):
+        prepared = prep(geometry)
+        candidates = [h if isinstance(h, (int, np.integer)) else position[id(h)] for h in tree.query(geometry)]
+        pairs += [(i, j) for j in sorted(candidates) if j > i and prepared.intersects(geometries[j])]
+    return pairs
+
+def build_pairs(df, name_col='Name', region_col='region'):
+    """
+    Find every pair of neighbouring constituencies within each region, as a dataframe with the region, set_no,
+    name1 and name2. The pairs (and so set_no's) are in the same order as comparing every pair in turn.
+    """
+    regions, set_nos, name1, name2 = [], [], [], []
+    for region in np.unique(df[region_col]):
+        df2 = df[df[region_col] == region]
+        names = df2[name_col].values
+        for i, j in neighbour_pairs(df2['geometry'].values):
+            regions.append(region)
+            name1.append(names[i])
+            name2.append(names[j])
+    return pd.DataFrame({'region': regions, 'set_no': np.arange(1, len(regions) + 1), 'name1': name1,
+                         'name2': name2})
+
+def cached_pairs(df, shapefile, cache_dir="../Data/Cache", name_col='Name', region_col='region'):
+    """
+    As build_pairs, but saved in cache_dir under a key made from the checksum of the shapefile and the
+    constituencies (and regions) in df, so that reruns read the pairs straight back.
+    shapefile - path of the .shp file the geometries were read from
+    """
+    base = os.path.splitext(shapefile)[0]
+    files = [base + ext for ext in ['.shp', '.shx', '.dbf'] if os.path.exists(base + ext)]
+    h = hashlib.sha1(file_checksum(files).encode())
+    h.update(repr(list(zip(df[region_col], df[name_col]))).encode())
+    cache_file = os.path.join(cache_dir, f"const_pairs_{h.hexdigest()}.csv.gz")
+    if os.path.exists(cache_file):
+        return pd.read_csv(cache_file)
+    const_pairs = build_pairs(df, name_col, region_col)
+    os.makedirs(cache_dir, exist_ok=True)
+    const_pairs.to_csv(cache_file, index=False, compression='gzip')
+    return const_pairs
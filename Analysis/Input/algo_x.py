@@ -58,17 +58,56 @@ class ExactCover(Iterator):
         self.solution = []
 
         # Make all the initial choices.
+        self.contradictory = False
         try:
             for i in initial:
                 self._choose(i)
             self.iter = self._solve()
         except KeyError:
             # Initial choices were contradictory, so there are no solutions.
+            self.contradictory = True
             self.iter = iter(())
 
     def __next__(self):
         return next(self.iter)
 
+    def count(self, memo=True):
+        """Return the number of solutions without constructing any of them.
+
+        Optional argument:
+        memo -- Cache the number of solutions of each sub-problem, keyed
+            on the set of unsatisfied constraints? (Default: True.)
+
+        For example:
+
+            >>> ExactCover(dict(A = [1, 2], B = [3, 4], C = [1, 3],
+            ...                 D = [2, 4], E = [1, 4], F = [2, 3])).count()
+            3
+
+        """
+        if self.contradictory:
+            return 0
+        return self._count({} if memo else None)
+
+    def _count(self, cache):
+        if not self.unsatisfied:
+            return 1
+        if cache is not None:
+            key = frozenset(self.unsatisfied)
+            if key in cache:
+                return cache[key]
+
+        best = min(self.unsatisfied, key=lambda j:len(self.choices[j]))
+        total = 0
+        for i in list(self.choices[best]):
+            self._choose(i)
+            total += self._count(cache)
+            self._unchoose(i)
+
+        if cache is not None:
+            cache[key] = total
+        return total
+
     def _solve(self):
         if not self.unsatisfied:
             # No remaining unsatisfied constraints.
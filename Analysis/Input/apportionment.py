@@ -0,0 +1,137 @@
+# Seat allocation methods, vectorised so that the seats for every merged set are found in one call.
+# Method used were obtained from these wikipedia articles:
+# https://en.wikipedia.org/wiki/Highest_averages_method
+# https://en.wikipedia.org/wiki/Largest_remainder_method
+import numpy as np
+import pandas as pd
+
+# Divisor for a party which has already won n seats. A party's first quotient is always its total vote. Other
+# divisor sequences can be added here and used by name.
+DIVISORS = {
+    'dhondt': lambda n: n + 1,
+    'webster': lambda n: 2*n + 1,
+    'imperiali': lambda n: n/2 + 1,
+    'huntington': lambda n: np.where(n == 0, 1, (n*(n+1))**0.5),
+}
+# Quota given the total vote and the number of seats
+QUOTAS = {
+    'hare': lambda total, seats: total / seats,
+    'droop': lambda total, seats: np.floor(1 + total / (1 + seats)),
+}
+METHODS = ['dhondt', 'webster', 'imperiali', 'huntington', 'hare', 'droop']
+
+def apply_cutoff(votes, cutoff=None):
+    """
+    Remove the votes of the parties which fail to get more than the cutoff (a proportion of the total vote in
+    the set)
+    """
+    votes = np.asarray(votes, dtype=float)
+    if cutoff is not None and cutoff > 0:
+        votes = np.where(votes > np.round(cutoff * votes.sum(axis=1))[:, None], votes, 0)
+    return votes
+
+def _count_seats(party, n_parties):
+    """
+    Count the seats won by each party, given a matrix with a row per set of the party winning each seat
+    """
+    return (party[:, :, None] == np.arange(n_parties)).sum(axis=1)
+
+def highest_averages(votes, seats, method='dhondt'):
+    """
+    Allocate seats using a highest averages (divisor) method.
+    votes - matrix of votes with a row per set and a column per party
+    seats - number of seats to allocate in each set
+    Returns a matrix of seats the same shape as votes. Ties go to the party in the earlier column.
+    """
+    votes = np.asarray(votes, dtype=float)
+    divisors = DIVISORS[method](np.arange(seats))
+    # The quotient of every party for each of the seats they could win, ordered by party then seat
+    quotients = (votes[:, :, None] / divisors).reshape(votes.shape[0], -1)
+    # A stable sort keeps equal quotients in party order, matching awarding the seats one at a time
+    winners = np.argsort(-quotients, axis=1, kind='stable')[:, :seats]
+    return _count_seats(winners // seats, votes.shape[1])
+
+def largest_remainder(votes, seats, method='hare'):
+    """
+    Allocate seats using a largest remainder (quota) method: each party wins a seat for every full quota of votes
+    and any seats left over go to the parties with the largest remainders.
+    votes - matrix of votes with a row per set and a column per party
+    seats - number of seats to allocate in each set
+    Returns a matrix of seats the same shape as votes. Ties go to the party in the earlier column.
+    """
+    votes = np.asarray(votes, dtype=float)
+    quota = QUOTAS[method](votes.sum(axis=1), seats)
+    votes_quota = votes / quota[:, None]
+    won = np.floor(votes_quota).astype(int)
+    remaining = seats - won.sum(axis=1)
+    # Position of each party when ordered by remainder, largest first
+    order = np.argsort(-(votes_quota - won), axis=1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(votes.shape[1])[None, :], axis=1)
+    return won + (rank < remaining[:, None])
+
+def simple_pr(votes, seats, cutoff=None):
+    """
+    Give each party its share of the seats, rounded, after removing parties below the cutoff (a proportion of the
+    vote). The total may not come to seats.
+    """
+    votes = apply_cutoff(votes, cutoff)
+    return np.round(votes / votes.sum(axis=1)[:, None] * seats).astype(int)
+
+def allocate(votes, seats, method='dhondt', cutoff=None):
+    """
+    Allocate seats with any of the methods in DIVISORS or QUOTAS (see highest_averages and largest_remainder) or
+    simple_pr, after removing the parties below the cutoff.
+    """
+    if method == 'simple_pr':
+        return simple_pr(votes, seats, cutoff)
+    votes = apply_cutoff(votes, cutoff)
+    if method in DIVISORS:
+        return highest_averages(votes, seats, method)
+    elif method in QUOTAS:
+        return largest_remainder(votes, seats, method)
+    raise ValueError(f"Unknown method {method}, should be one of {[*DIVISORS, *QUOTAS, 'simple_pr']}")
+
+def add_method(df, method='dhondt', seats=2, cutoff=None, parties=None):
+    """
+    Seats won by each party in each merged set.
+    df - votes for each party, indexed by set_no (as from add_results)
+    Returns a dataframe with the set_no and a column for every party which won a seat in any of the sets.
+    """
+    parties = list(df.columns) if parties is None else parties
+    df2 = pd.DataFrame(allocate(df[parties].values, seats, method, cutoff), index=df.index, columns=parties)
+    df2 = df2.loc[:, df2.sum() > 0].reset_index()
+    return df2.rename(columns={df2.columns[0]: 'set_no'})
+
+class SeatCalculator:
+    """
+    Seats won in every merged set, computed from the votes when they are first asked for (rather than read from
+    the MergedResults files) and cached by (method, seats, cutoff), so that sweeps over methods and cutoffs only
+    allocate the seats for each combination once.
+    votes - dict from the number of constituencies merged (2 / 3 / 4) to the votes for each party in each set,
+        indexed by set_no (as from add_results)
+    """
+    def __init__(self, votes, parties=None):
+        self.votes = votes
+        self.parties = list(next(iter(votes.values())).columns) if parties is None else parties
+        self.cache = {}
+
+    def seats(self, method, seats, cutoff=None):
+        """
+        Seats won by each party (columns in the order of self.parties) in each of the sets of `seats`
+        constituencies, as a matrix in the order of self.votes[seats].
+        """
+        key = (method, seats, cutoff)
+        if key not in self.cache:
+            self.cache[key] = allocate(self.votes[seats][self.parties].values, seats, method, cutoff)
+        return self.cache[key]
+
+    def merged(self, method, cutoff=None):
+        """
+        The seats for each set size as dataframes with a set_no column, in the layout of the MergedResults files
+        """
+        merged = {}
+        for s, df in self.votes.items():
+            merged[s] = pd.DataFrame(self.seats(method, s, cutoff), columns=self.parties).assign(
+                set_no=df.index.values)
+        return merged
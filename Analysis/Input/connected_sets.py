@@ -0,0 +1,86 @@
+# Enumerating the sets of k neighbouring constituencies (the connected sets of size k in the graph of neighbours)
+import numpy as np
+import pandas as pd
+
+def adjacency_lists(const_pairs):
+    """
+    For each region, the constituency names (sorted) and a list with the neighbours of each constituency (as
+    positions in the names)
+    """
+    adjacency = {}
+    for region, df in const_pairs.groupby('region'):
+        names = np.unique(df[['name1', 'name2']].values)
+        code1 = np.searchsorted(names, df['name1'].values)
+        code2 = np.searchsorted(names, df['name2'].values)
+        neighbours = [set() for _ in names]
+        for a, b in zip(code1, code2):
+            neighbours[a].add(b)
+            neighbours[b].add(a)
+        adjacency[region] = (names, [sorted(n) for n in neighbours])
+    return adjacency
+
+def connected_subsets(neighbours, k):
+    """
+    All of the connected sets of k vertices of a graph, given as lists of neighbours, using the ESU algorithm
+    (Wernicke, 2006). Each set is only found once (from its smallest vertex, only extending to larger vertices
+    that are not neighbours of the set so far), so no deduplication is needed.
+    Returns an int matrix with a row per set, with the vertices of each row and the rows in sorted order.
+    """
+    sets = []
+
+    def extend(subset, extension, closed, v):
+        if len(subset) == k:
+            sets.append(sorted(subset))
+            return
+        extension = list(extension)
+        while extension:
+            w = extension.pop()
+            # Vertices next to w that are not in or next to the subset (so can only be reached through w)
+            exclusive = [u for u in neighbours[w] if u > v and u not in closed]
+            extend(subset + [w], extension + exclusive, closed.union(neighbours[w]), v)
+
+    for v in range(len(neighbours)):
+        extend([v], [u for u in neighbours[v] if u > v], set(neighbours[v]).union([v]), v)
+    if len(sets) == 0:
+        return np.zeros((0, k), dtype=np.int32)
+    sets = np.array(sets, dtype=np.int32)
+    return sets[np.lexsort(sets.T[::-1])]
+
+def build_sets(const_pairs, k, base=None):
+    """
+    All of the sets of k neighbouring constituencies in each region, as a dataframe with the region, name1 ... namek
+    and a set_no. By default the names are in alphabetical order, as are the sets (and so set_no's) within each
+    region.
+    base - the sets of k-1 neighbouring constituencies (e.g. const_tris when k = 4). If given the sets are numbered
+        by extending these instead: ordered by the first base set they contain and then the name of the
+        constituency added to it, which is the order the sets were originally built in (so the set_no's of
+        existing results are kept).
+    """
+    frames = []
+    for region, (names, neighbours) in adjacency_lists(const_pairs).items():
+        sets = connected_subsets(neighbours, k)
+        df = pd.DataFrame(names[sets], columns=[f"name{i + 1}" for i in range(k)])
+        frames.append(df.assign(region = region)[['region', *df.columns]])
+    df = pd.concat(frames, ignore_index=True)
+    if base is not None:
+        df = _extend_order(df, base, k)
+    return df.assign(set_no = np.arange(1, len(df) + 1))
+
+def _extend_order(df, base, k):
+    """
+    Reorder the sets in df as the base sets (of size k-1) they extend, see build_sets
+    """
+    base_cols = [f"name{i + 1}" for i in range(k - 1)]
+    lookup = {(r, frozenset(n)): (s, n) for r, s, *n in base[['region', 'set_no', *base_cols]].values.tolist()}
+    rows = []
+    for region, *names in df[['region', *[f"name{i + 1}" for i in range(k)]]].values.tolist():
+        options = []
+        for name in names:
+            rest = frozenset(n for n in names if n != name)
+            if (region, rest) in lookup:
+                set_no, base_names = lookup[(region, rest)]
+                options.append((set_no, name, base_names))
+        set_no, name, base_names = min(options)
+        rows.append((set_no, name, [region, *base_names, name]))
+    rows.sort(key=lambda r: (r[0], r[1]))
+    return pd.DataFrame([r[2] for r in rows], columns=['region', *[f"name{i + 1}" for i in range(k)]])
@@ -0,0 +1,155 @@
+# Totalling the seats won by each party over every set in a solution
+import numpy as np
+import pandas as pd
+from AlgorithmX import MIXED_COVERS, AlgorithmXComponents, mixed_cover_solver
+# The number of constituencies in the sets listed in each of the removed set columns
+REMOVED_SEATS = {'pair': 2, 'triplet': 3, 'quad': 4}
+
+class SeatTables:
+    """
+    The seats won by each party in every set of 2 / 3 / 4 merged constituencies, held as dense matrices indexed by
+    set_no so that the seats for all of the solutions in a region can be found with a single gather and sum.
+    merged - dict from the number of constituencies merged (2 / 3 / 4) to the const_merged dataframes for a method
+    """
+    def __init__(self, merged):
+        # Parties in the order they first appear in the tables
+        self.parties = []
+        for s in sorted(merged):
+            self.parties += [p for p in merged[s].columns if p != 'set_no' and p not in self.parties]
+        self.matrices = {s: self._matrix(df) for s, df in merged.items()}
+
+    def _matrix(self, df):
+        """
+        Dense matrix with a row per set_no (and a column per party). There is an extra row of zeros at the end so
+        that the -1 padding in a solution matrix adds no seats.
+        """
+        matrix = np.zeros((df['set_no'].max() + 2, len(self.parties)), dtype=np.int32)
+        values = df.reindex(columns=self.parties).fillna(0).values
+        matrix[df['set_no'].values] = values
+        return matrix
+
+    @classmethod
+    def from_files(cls, method, directory="../Data/MergedResults"):
+        """
+        Read the const_merged_{2,3,4}_{method} tables.
+        """
+        return cls({s: pd.read_csv(f"{directory}/const_merged_{s}_{method}.csv.gz") for s in [2, 3, 4]})
+
+    def seats(self, solutions, seats):
+        """
+        The seats won by each party in each solution, including the sets that were removed.
+        solutions - a solution_store.Solutions of sets of `seats` constituencies
+        Returns an int matrix with a row per solution and a column per party (see self.parties).
+        """
+        totals = self.matrices[seats][solutions.soln].sum(axis=1)
+        for col, removed in solutions.removed.items():
+            totals += self.matrices[REMOVED_SEATS[col]][removed].sum(axis=1)
+        return totals
+
+    def seats_frame(self, solutions, seats):
+        """
+        As seats, but as a dataframe with a column per party.
+        """
+        return pd.DataFrame(self.seats(solutions, seats), columns=self.parties)
+
+def get_predicted_seats(store, methods, directory="../Data/MergedResults"):
+    """
+    The seats won by each party for every solution in a SolutionStore (see solution_store), for each of the methods,
+    with the region, seats and method of each row.
+    """
+    frames = []
+    for method in methods:
+        tables = SeatTables.from_files(method, directory)
+        for region, seats in store.keys():
+            df = tables.seats_frame(store.get(region, seats), seats)
+            frames.append(df.assign(region = region, seats = seats, method = method))
+    return pd.concat(frames, ignore_index=True, sort=False).fillna(0)
+
+def sweep_predicted_seats(store, calculator, methods, cutoffs):
+    """
+    As get_predicted_seats, but with the seats for each merged set computed by an apportionment.SeatCalculator
+    rather than read from the MergedResults files, for every combination of method and cutoff (given in the
+    method and cutoff columns, with no cutoff given as 0). The calculator caches the seats for each combination,
+    so repeated sweeps only allocate seats for the new ones.
+    """
+    frames = []
+    for method in methods:
+        for cutoff in cutoffs:
+            tables = SeatTables(calculator.merged(method, cutoff))
+            for region, seats in store.keys():
+                df = tables.seats_frame(store.get(region, seats), seats)
+                frames.append(df.assign(region = region, seats = seats, method = method, cutoff = cutoff))
+    return pd.concat(frames, ignore_index=True, sort=False).fillna(0)
+
+class SeatDistribution:
+    """
+    The exact distribution of the seats won by each party over every solution of a region, found by the solver
+    without enumerating (or sampling) the solutions (see AlgorithmX.distribution).
+    df - the sets of `seats` constituencies in the region (e.g. const_pairs for the region when seats is 2)
+    tables - SeatTables for the method
+    minority, most - when the number of constituencies isn't divisible by seats, the sets of the other size which
+        make up the rest of the region and how many of them a solution uses (see MIXED_COVERS and for_region).
+        Each solution is then a cover using up to `most` of them, as in algox_modules.mixed_solver.
+    If the region has no solutions self.count is 0 and the probabilities, means and variances are all NaN.
+    """
+    def __init__(self, df, tables, seats, deadline=None, minority=None, most=0):
+        self.parties = tables.parties
+        matrix = tables.matrices[seats]
+        if minority is None or most == 0:
+            name_cols = df.columns[df.columns.str.startswith('name')]
+            codes, const_list = pd.factorize(df[name_cols].values.ravel(), sort=True)
+            solver = AlgorithmXComponents.from_arrays(df['set_no'].values, codes.reshape(len(df), len(name_cols)),
+                                                      len(const_list))
+            weights = {s: matrix[s] for s in df['set_no'].values}
+        else:
+            # The minority sets are tagged with their negative set_no (see AlgorithmX.mixed_cover_solver)
+            minority_cols = minority.columns[minority.columns.str.startswith('name')]
+            minority_matrix = tables.matrices[len(minority_cols)]
+            solver = mixed_cover_solver(df['set_no'].values, df[df.columns[df.columns.str.startswith('name')]].values,
+                                        minority['set_no'].values, minority[minority_cols].values, most)
+            weights = None if solver is None else {s: matrix[s] if s > 0 else minority_matrix[-s] for s in solver.tags}
+        # Number of solutions in which each party (rows) wins each number of seats (columns)
+        if solver is None:
+            self.counts = np.zeros((len(self.parties), 1), dtype=object)
+        else:
+            self.counts = solver.distribution(weights, deadline=deadline)
+        self.count = int(self.counts[0].sum())
+        if self.count == 0:
+            self.probabilities = np.full(self.counts.shape, np.nan)
+        else:
+            self.probabilities = (self.counts / self.count).astype(float)
+
+    @classmethod
+    def for_region(cls, const_sets, region, seats, tables, deadline=None):
+        """
+        The distribution for a region, covered with the sets of `seats` constituencies along with the minority sets
+        in MIXED_COVERS when its number of constituencies isn't divisible by seats.
+        const_sets - dict from the number of constituencies merged (2 / 3 / 4) to const_pairs / const_tris /
+            const_quads
+        """
+        sets = {s: df[df['region'] == region] for s, df in const_sets.items()}
+        df = sets[seats]
+        n = len(np.unique(df[df.columns[df.columns.str.startswith('name')]].values))
+        if n % seats == 0:
+            return cls(df, tables, seats, deadline=deadline)
+        removed_col, most = MIXED_COVERS[(seats, n % seats)]
+        return cls(df, tables, seats, deadline=deadline, minority=sets[REMOVED_SEATS[removed_col]], most=most)
+
+    def frame(self):
+        """
+        The probability of each party (rows) winning each number of seats (columns) in a solution picked at random
+        """
+        return pd.DataFrame(self.probabilities, index=self.parties)
+
+    def mean(self):
+        """
+        The mean number of seats won by each party over all of the solutions
+        """
+        return pd.Series(self.probabilities @ np.arange(self.counts.shape[1]), index=self.parties)
+
+    def variance(self):
+        """
+        The variance of the number of seats won by each party over all of the solutions
+        """
+        k = np.arange(self.counts.shape[1])
+        return pd.Series(self.probabilities @ k**2, index=self.parties) - self.mean()**2
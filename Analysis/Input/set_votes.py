@@ -0,0 +1,63 @@
+# Votes for each party in every merged set, found as a sparse matrix product
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def merging_name(names):
+    """
+    Bit of string replacement so that constituency names can be matched between the datasets
+    """
+    return [str.replace(n.lower(), 'st. ', 'st ') for n in names]
+
+def constituency_votes(bes, parties, name_col='constituency_name'):
+    """
+    The votes for each party (columns) in each constituency, indexed by the merging name
+    """
+    votes = bes[parties].fillna(0)
+    votes.index = pd.Index(merging_name(bes[name_col]), name='merging_name')
+    return votes
+
+class SetIncidence:
+    """
+    Sparse (sets x constituencies) matrix with a 1 where a set contains a constituency, built once for a table of
+    sets (const_pairs / const_tris / const_quads) so that the votes in every set can be found with one matrix
+    product however the constituency votes change (e.g. a different election or a simulated swing).
+    df - table of sets with a set_no and name columns
+    constituencies - the merging names of all of the constituencies (e.g. constituency_votes(...).index).
+        Constituencies in the sets that are not in this list are left out.
+    """
+    def __init__(self, df, constituencies):
+        self.constituencies = pd.Index(constituencies)
+        self.set_no = df['set_no'].values
+        name_cols = df.columns[df.columns.str.startswith('name')]
+        cols = self.constituencies.get_indexer(merging_name(df[name_cols].values.ravel()))
+        rows = np.repeat(np.arange(len(df)), len(name_cols))
+        found = cols >= 0
+        self.matrix = sparse.csr_matrix((np.ones(found.sum(), dtype=np.int64), (rows[found], cols[found])),
+                                        shape=(len(df), len(self.constituencies)))
+
+    def votes(self, votes):
+        """
+        The votes for each party in each set, indexed by set_no.
+        votes - votes for each party (columns) in each constituency, indexed by merging name (see
+            constituency_votes)
+        """
+        values = votes.reindex(self.constituencies).fillna(0).values.astype(np.int64)
+        return pd.DataFrame(self.matrix @ values, index=pd.Index(self.set_no, name='set_no'),
+                            columns=votes.columns).sort_index()
+
+def imbalance_costs(electorates, region_electorate, n_sets):
+    """
+    Cost of each set for AlgorithmX.best: the squared relative difference between its electorate and the region's
+    total electorate over the number of sets in a cover (the mean electorate of the merged constituencies in
+    every cover), so the cheapest covers are those whose merged constituencies have the most even electorates.
+    electorates - electorate of each set, indexed by set_no (e.g. from SetIncidence.votes)
+    region_electorate - total electorate of the constituencies being covered
+    n_sets - number of sets in a cover (the number of constituencies over the number merged in each set). For the
+        minority sets of a mixed cover (see AlgorithmX.MIXED_COVERS) use the number of constituencies over their
+        size, which needn't be a whole number, so that they are held to the same mean electorate per constituency.
+    Returns a dict from set_no to cost
+    """
+    electorates = pd.Series(electorates.squeeze(axis=1) if electorates.ndim > 1 else electorates)
+    target = region_electorate / n_sets
+    return (((electorates - target) / target)**2).to_dict()